@@ -3,10 +3,12 @@
 source config.sh
 
 set -u
-filename='qc_titles.py'
 DEST="${BOT_LOCATION}/scripts/userscripts"
 SRC="."
 
-source overwrite.sh
+for filename in 'qc_titles.py' 'qc_history.py' 'qc_profile.py'
+do
+	(source overwrite.sh)
+done
 
 ls -l "$DEST"
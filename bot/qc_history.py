@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+r"""
+History of snapshots of https://questionablecontent.net/archive-list.php.
+
+Every distinct downloaded version of the archive is kept in an SQLite
+database.  Most snapshots are stored as compressed line deltas against the
+previous snapshot, with a full copy every KEYFRAME_INTERVAL snapshots, so
+that years of snapshots take little space.  Identical consecutive downloads
+are stored only as a fetch time.
+
+Titles parsed from each snapshot are indexed too: for every snapshot, only
+titles which differ from the previous snapshot are stored.  This makes the
+query "which titles changed between snapshots A and B" fast, without
+decompressing any snapshots.
+
+Used by 'qc_titles.py' to record snapshots.  Can be used as a script to
+query the history:
+
+    python3 qc_history.py list
+    python3 qc_history.py changes 12 40
+    python3 qc_history.py show 40 > archive-list.php
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+
+import argparse
+import difflib
+import hashlib
+import json
+import lzma
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+
+DEFAULT_DB = 'archive_history.sqlite'
+# store full snapshot after this many deltas
+KEYFRAME_INTERVAL = 50
+
+
+def connect(filename: str = DEFAULT_DB):
+    db = sqlite3.connect(filename, timeout=60)
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY,
+            sha1 TEXT NOT NULL,
+            base INTEGER,
+            data BLOB NOT NULL);
+        CREATE TABLE IF NOT EXISTS fetches (
+            time REAL NOT NULL,
+            snapshot INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS titles (
+            snapshot INTEGER NOT NULL,
+            num INTEGER NOT NULL,
+            title TEXT,
+            PRIMARY KEY (num, snapshot));
+        CREATE INDEX IF NOT EXISTS titles_by_snapshot ON titles (snapshot);
+    ''')
+    return db
+
+
+def make_delta(old_lines: list, new_lines: list) -> list:
+    """
+    Line delta: list of ranges [i1, i2] to copy from the old version and
+    lists of lines to insert.
+    """
+    delta = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append(new_lines[j1:j2])
+    return delta
+
+
+def apply_delta(old_lines: list, delta: list) -> list:
+    lines = []
+    for op in delta:
+        if len(op) == 2 and isinstance(op[0], int):
+            lines.extend(old_lines[op[0]:op[1]])
+        else:
+            lines.extend(op)
+    return lines
+
+
+def snapshot_text(db, snapshot_id: int) -> str:
+    """
+    Reconstruct full text of a snapshot.
+    """
+    chain = []
+    while snapshot_id is not None:
+        base, data = db.execute('SELECT base, data FROM snapshots WHERE id = ?', (snapshot_id,)).fetchone()
+        chain.append((base, data))
+        snapshot_id = base
+    lines = None
+    for base, data in reversed(chain):
+        raw = lzma.decompress(data).decode('utf-8')
+        if base is None:
+            lines = raw.splitlines(keepends=True)
+        else:
+            lines = apply_delta(lines, json.loads(raw))
+    return ''.join(lines)
+
+
+def titles_at(db, snapshot_id: int) -> dict:
+    """
+    Returns dict from comic number to title as of given snapshot.
+    """
+    result = {}
+    for num, title in db.execute('''SELECT num, title FROM titles AS t
+            WHERE snapshot = (SELECT MAX(snapshot) FROM titles WHERE num = t.num AND snapshot <= ?)''',
+            (snapshot_id,)):
+        if title is not None:
+            result[num] = title
+    return result
+
+
+def record(db, text: str, titles: dict, fetched: float = None) -> int:
+    """
+    Record a downloaded archive and titles parsed from it.
+    Returns id of the snapshot.
+    """
+    fetched = fetched or time.time()
+    sha1 = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    with db:
+        last = db.execute('SELECT id, sha1 FROM snapshots ORDER BY id DESC LIMIT 1').fetchone()
+        if last is not None and last[1] == sha1:
+            db.execute('INSERT INTO fetches (time, snapshot) VALUES (?, ?)', (fetched, last[0]))
+            return last[0]
+        base = None
+        payload = text
+        if last is not None:
+            since_keyframe = db.execute('''SELECT COUNT(*) FROM snapshots
+                WHERE id > (SELECT MAX(id) FROM snapshots WHERE base IS NULL)''').fetchone()[0]
+            if since_keyframe < KEYFRAME_INTERVAL:
+                base = last[0]
+                old_lines = snapshot_text(db, base).splitlines(keepends=True)
+                payload = json.dumps(make_delta(old_lines, text.splitlines(keepends=True)))
+        snapshot_id = db.execute('INSERT INTO snapshots (sha1, base, data) VALUES (?, ?, ?)',
+            (sha1, base, lzma.compress(payload.encode('utf-8')))).lastrowid
+        db.execute('INSERT INTO fetches (time, snapshot) VALUES (?, ?)', (fetched, snapshot_id))
+        old_titles = titles_at(db, last[0]) if last is not None else {}
+        for num in old_titles.keys() | titles.keys():
+            if old_titles.get(num) != titles.get(num):
+                db.execute('INSERT INTO titles (snapshot, num, title) VALUES (?, ?, ?)',
+                    (snapshot_id, num, titles.get(num)))
+    return snapshot_id
+
+
+def changed_titles(db, a: int, b: int) -> list:
+    """
+    Returns sorted list of tuples (number, title in A, title in B) of comics
+    whose titles differ between snapshots 'a' and 'b'.
+    """
+    def title(num, snapshot):
+        row = db.execute('''SELECT title FROM titles WHERE num = ? AND snapshot <= ?
+            ORDER BY snapshot DESC LIMIT 1''', (num, snapshot)).fetchone()
+        return row[0] if row else None
+
+    lo, hi = min(a, b), max(a, b)
+    result = []
+    for (num,) in db.execute('SELECT DISTINCT num FROM titles WHERE snapshot > ? AND snapshot <= ? ORDER BY num',
+            (lo, hi)).fetchall():
+        old, new = title(num, a), title(num, b)
+        if old != new:
+            result.append((num, old, new))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query history of archive-list.php snapshots.")
+    parser.add_argument('--db', default=DEFAULT_DB, help="history database (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="list snapshots")
+    p = commands.add_parser('changes', help="list titles changed between two snapshots")
+    p.add_argument('a', type=int)
+    p.add_argument('b', type=int)
+    p = commands.add_parser('show', help="print full text of a snapshot")
+    p.add_argument('id', type=int)
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    if args.command == 'list':
+        for snapshot_id, first, last, count in db.execute('''SELECT snapshot, MIN(time), MAX(time), COUNT(*)
+                FROM fetches GROUP BY snapshot ORDER BY snapshot'''):
+            print('{}\t{}\t{}\t{} fetches'.format(snapshot_id, datetime.fromtimestamp(first).isoformat(' ', 'seconds'),
+                datetime.fromtimestamp(last).isoformat(' ', 'seconds'), count))
+    elif args.command == 'changes':
+        for num, old, new in changed_titles(db, args.a, args.b):
+            print('{}\t{}\t{}'.format(num, old, new))
+    elif args.command == 'show':
+        sys.stdout.write(snapshot_text(db, args.id))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,13 @@ Parameters:
 
 -summary        Extra message to add to the edit summary.
 
+-lookahead      Number of pages, including the current one, to fetch and prepare in background, while the
+                current page is being reviewed.  0 prepares each page only when it is reviewed.  Default is 3.
+
+-profile        Profile the run: write cProfile data to '<prefix>.prof', folded stacks for flame graph tools to
+                '<prefix>.folded', and print peak memory, wall vs CPU time of network and parsing functions,
+                and top functions.  Optional value is the prefix, default is 'qc_images'.
+
 Example:
 
     python3 pwb.py qc_titles '-summary:extra message'
@@ -41,17 +48,23 @@ import re
 import urllib.request
 import os.path
 import datetime
+import time
 from textwrap import dedent
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import pywikibot
 from pywikibot.bot_choice import QuitKeyboardInterrupt
 from pywikibot.tools.formatter import color_format
 from pywikibot.textlib import getCategoryLinks
 from pywikibot.textlib import extract_sections
+from pywikibot.diff import PatchManager
 
 
 DEBUG = False
+# number of File pages prepared in advance
+DEFAULT_LOOKAHEAD = 3
 
 
 def is_fresh(filename):
@@ -194,6 +207,121 @@ def request_pages():
         yield p
 
 
+page_number_regex = re.compile('\|([1-9][0-9]*)\}')
+filename_number_regex = re.compile('([1-9][0-9]*)')
+templates_ready = ['QC image', 'File information', 'Self']
+
+
+def propose_description(summary):
+    """
+    Clean up text of section "Summary" to be used as description of the image.
+    """
+    summary = summary.strip()
+    i = summary.find('{')
+    if i > 0:
+        summary = summary[0:i]
+    i = summary.find(' in ')
+    if i > 0:
+        summary = summary[0:i]
+    summary = summary.strip()
+    if summary[-1:] == '.':
+        summary = summary[0:-1]
+    return summary or None
+
+
+def propose_comic_number(old_text, page_title):
+    comic_num = None
+    m = page_number_regex.search(old_text)
+    if m:
+        try:
+            comic_num = int(m.group(1))
+        except:
+            pass
+    if comic_num is None:
+        m = filename_number_regex.search(page_title)
+        if m:
+            try:
+                comic_num = int(m.group(1))
+            except:
+                pass
+    return comic_num
+
+
+class Candidate:
+    """
+    File page prepared for review: everything that needs the network or
+    heavy parsing is done in advance by prepare_candidate().
+    """
+
+    def __init__(self, item, page):
+        self.item = item
+        self.page = page
+        self.page_title = page.title()
+        self.ready_template = None
+        self.old_text = None
+        self.header = None
+        self.footer = None
+        self.summary = None
+        self.licensing = None
+        self.got_summary_from_header = False
+        self.description = None
+        self.comic_num = None
+        self.new_text = None
+        self.patch = None
+
+    def build_text(self, description, comic_num):
+        new_text = dedent("""
+            == Summary ==
+            {{{{QC image|{0}|{1}}}}}
+
+            == Licensing ==
+            {{{{Fairuse}}}}
+            """.format(description, comic_num)).strip()
+        header = self.header.strip()
+        if not self.got_summary_from_header and len(header) > 0:
+            new_text = header + '\n\n' + new_text
+        footer = self.footer.strip()
+        if len(footer) > 0:
+            new_text += '\n\n' + footer
+        return new_text
+
+
+def prepare_candidate(site, item):
+    """
+    Fetch and pre-process a File page. Runs in a look-ahead worker thread,
+    while the operator answers prompts about previous pages.
+    """
+    c = Candidate(item, pywikibot.Page(site, 'File:' + item['title']))
+    for t in c.page.templatesWithParams():
+        for r in templates_ready:
+            if r in t[0].title():
+                c.ready_template = t[0]
+                return c
+
+    c.old_text = c.page.get()
+    # categories = getCategoryLinks(old_text, site)
+    # categories_text = '\n'.join(map(lambda c:c.aslink(), categories))
+    (c.header, body, c.footer) = extract_sections(c.old_text, site)
+    for section in body:
+        if 'ummary' in section[0] or 'escription' in section[0]:
+            c.summary = section[1]
+        if 'icens' in section[0]:
+            c.licensing = section[1]
+    if c.summary is None:
+        c.got_summary_from_header = True
+        c.summary = c.header
+    if c.summary is not None and len(c.summary.strip()) > 0:
+        c.description = propose_description(c.summary)
+    c.comic_num = propose_comic_number(c.old_text, c.page_title)
+
+    # pre-render diff for the proposed values
+    if c.description is not None and c.comic_num is not None:
+        c.new_text = c.build_text(c.description, c.comic_num)
+        if c.new_text != c.old_text:
+            c.patch = PatchManager(c.old_text, c.new_text, context=3)
+    return c
+
+
 def main(*args):
     """
     Process command line arguments and invoke bot.
@@ -204,15 +332,53 @@ def main(*args):
     @type args: str
     """
 
+    started = time.perf_counter()
+    started_cpu = time.process_time()
     local_args = pywikibot.handle_args(args)
+    profile_prefix = None
+    for arg in local_args:
+        option, sep, value = arg.partition(':')
+        if option == '-profile':
+            profile_prefix = value or 'qc_images'
+    if profile_prefix is None:
+        return run(local_args)
+
+    # imported only here, so that there is no overhead without option -profile
+    import qc_profile
+    profiler = qc_profile.Profiler(profile_prefix)
+    profiler.record('pywikibot.handle_args', time.perf_counter() - started, time.process_time() - started_cpu)
+    profiler.hook(globals(), ['request_list', 'prepare_candidate', 'put_text'])
+    profiler.hook(pywikibot, ['Site', 'showDiff', 'input', 'input_choice'])
+    profiler.start()
+    try:
+        return run(local_args)
+    finally:
+        profiler.stop(pywikibot.output)
+
+
+def run(local_args):
+    """
+    Invoke bot with command line arguments, which were not handled by Pywikibot.
+    """
 
     # default values for options
     extra_summary = None
+    lookahead = DEFAULT_LOOKAHEAD
 
     for arg in local_args:
         option, sep, value = arg.partition(':')
         if option == '-summary':
             extra_summary = value
+        elif option == '-lookahead':
+            try:
+                lookahead = int(value)
+                if lookahead < 0:
+                    raise ValueError
+            except ValueError:
+                pywikibot.error("Wrong value of option '-lookahead': {}".format(value))
+                return False
+        elif option == '-profile':
+            pass
         else:
             pywikibot.warning("Unrecognized option {}".format(option))
 
@@ -224,73 +390,48 @@ def main(*args):
         return True
 
 
-    page_number_regex = re.compile('\|([1-9][0-9]*)\}')
-    filename_number_regex = re.compile('([1-9][0-9]*)')
-    templates_ready = ['QC image', 'File information', 'Self']
     site = pywikibot.Site()
     looked_at = set()
     pages = request_pages()
-    for p in pages:
-        if p['title'] in looked_at:
+    prepared = deque()
+    exhausted = False
+    # without look-ahead, pages are prepared in the main thread
+    pool = ThreadPoolExecutor(max_workers=lookahead) if lookahead > 0 else None
+    while True:
+        # keep the look-ahead queue full
+        while not exhausted and len(prepared) < max(1, lookahead):
+            p = next(pages, None)
+            if p is None or p['title'] in looked_at:
+                exhausted = True
+                break
+            looked_at.add(p['title'])
+            prepared.append((p, pool.submit(prepare_candidate, site, p) if pool else None))
+        if not prepared:
             pywikibot.output("Done.")
             break
-        else:
-            looked_at.add(p['title'])
+        p, future = prepared.popleft()
+        page_title = 'File:' + p['title']
         try:
-            page_title = 'File:' + p['title']
-            page = pywikibot.Page(site, page_title)
+            c = future.result() if future else prepare_candidate(site, p)
+            page = c.page
             click_url = ROOT_URL + 'wiki/' + page.title(underscore=True)
             pywikibot.output("Page '{0}', id={1} | {2}".format(page_title, p['id'], click_url))
-            ts = page.templatesWithParams()
-            if len(ts) > 0:
-                found_ready = False
-                for t in ts:
-                    for r in templates_ready:
-                        if r in t[0].title():
-                            pywikibot.output(color_format("Page {lightgreen}{0}{default} has template: {1}",
-                                page_title, t[0]))
-                            found_ready = True
-                            break
-                if found_ready:
-                    pywikibot.output("\tSkipping.")
-                    continue
+            if c.ready_template is not None:
+                pywikibot.output(color_format("Page {lightgreen}{0}{default} has template: {1}",
+                    page_title, c.ready_template))
+                pywikibot.output("\tSkipping.")
+                continue
 
-            old_text = page.get()
-            # categories = getCategoryLinks(old_text, site)
-            # categories_text = '\n'.join(map(lambda c:c.aslink(), categories))
-            (header, body, footer) = extract_sections(old_text, site)
-            summary = None
-            licensing = None
+            old_text = c.old_text
             description = None
-            for section in body:
-                if 'ummary' in section[0] or 'escription' in section[0]:
-                    summary = section[1]
-                if 'icens' in section[0]:
-                    licensing = section[1]
-            got_summary_from_header = False
-            if summary is None:
-                got_summary_from_header = True
-                summary = header
-
-            new_text = None
             pywikibot.output(color_format("Editing page {lightblue}{0}{default}.", page_title))
-            if summary is not None and len(summary.strip()) > 0:
-                summary = summary.strip()
-                pywikibot.output("Have \"Summary\":\n\t{}".format(summary))
-                i = summary.find('{')
-                if i > 0:
-                    summary = summary[0:i]
-                i = summary.find(' in ')
-                if i > 0:
-                    summary = summary[0:i]
-                summary = summary.strip()
-                if summary[-1] == '.':
-                    summary = summary[0:-1]
-                pywikibot.output("Will have \"Summary\":\n\t{}".format(summary))
+            if c.description is not None:
+                pywikibot.output("Have \"Summary\":\n\t{}".format(c.summary.strip()))
+                pywikibot.output("Will have \"Summary\":\n\t{}".format(c.description))
                 choice = pywikibot.input_choice("Is it a good summary?",
                     [('Yes', 'y'), ('No', 'n'), ('open in Browser', 'b')], 'n')
                 if choice == 'y':
-                    description = summary
+                    description = c.description
                 elif choice == 'n':
                     pass
                 elif choice == 'b':
@@ -300,23 +441,10 @@ def main(*args):
                 description = pywikibot.input("Please describe the file:")
                 if description in ['s', 'skip']:
                     continue
-            if licensing is not None:
-                pywikibot.output("Have \"Licensing\":\n\t{}".format(licensing.strip()))
+            if c.licensing is not None:
+                pywikibot.output("Have \"Licensing\":\n\t{}".format(c.licensing.strip()))
 
-            comic_num = None
-            m = page_number_regex.search(old_text)
-            if m:
-                try:
-                    comic_num = int(m.group(1))
-                except:
-                    pass
-            if comic_num is None:
-                m = filename_number_regex.search(page.title())
-                if m:
-                    try:
-                        comic_num = int(m.group(1))
-                    except:
-                        pass
+            comic_num = c.comic_num
             if comic_num is not None:
                 pywikibot.output("Have comic #:\n\t{}".format(comic_num))
                 choice = pywikibot.input_choice("Is it a good comic number?",
@@ -336,26 +464,17 @@ def main(*args):
             if comic_num == 0:
                 comic_num = ''
 
-            new_text = dedent("""
-                == Summary ==
-                {{{{QC image|{0}|{1}}}}}
-
-                == Licensing ==
-                {{{{Fairuse}}}}
-                """.format(description, comic_num)).strip()
-            header = header.strip()
-            if not got_summary_from_header and len(header) > 0:
-                new_text = header + '\n\n' + new_text
-            footer = footer.strip()
-            if len(footer) > 0:
-                new_text += '\n\n' + footer
+            new_text = c.build_text(description, comic_num)
 
             # check if the edit is sensible
             if old_text == new_text:
                 pywikibot.output("No changes. Nothing to do.")
                 continue
             # report what will happen
-            pywikibot.showDiff(old_text, new_text, context=3)
+            if c.patch is not None and new_text == c.new_text:
+                c.patch.print_hunks()
+            else:
+                pywikibot.showDiff(old_text, new_text, context=3)
 
             summary = "add [[Template:QC image]]; mark as fair use " + \
                 "([[User:AndrybakBot#Image maintenance|Image maintenance bot task]])"
@@ -387,18 +506,22 @@ def main(*args):
                 break
 
         except pywikibot.NoPage:
-            pywikibot.error("{} doesn't exist, skipping.".format(page.title()))
+            pywikibot.error("{} doesn't exist, skipping.".format(page_title))
             continue
         except pywikibot.IsRedirectPage:
-            pywikibot.error("{} is a redirect, skipping".format(page.title()))
+            pywikibot.error("{} is a redirect, skipping".format(page_title))
             continue
         except pywikibot.Error as e:
             pywikibot.bot.suggest_help(exception=e)
             continue
         except QuitKeyboardInterrupt:
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
             sys.exit("User quit bot run.")
         else:
             pass
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == '__main__':
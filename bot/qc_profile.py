@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+r"""
+Profiling of bot runs, used by option -profile of 'qc_titles.py' and
+'qc_images.py'.  This module is imported only when profiling is requested,
+so it adds no overhead to normal runs.
+
+For the whole run, records:
+
+  * cProfile data of the main thread and of all threads started during the
+    run, merged into file '<prefix>.prof', readable by pstats, snakeviz, or
+    gprof2dot,
+  * the same data as folded stacks in file '<prefix>.folded', readable by
+    flamegraph.pl, speedscope, or inferno,
+  * peak memory usage traced by tracemalloc,
+  * wall-clock and CPU time of selected functions, e.g. API requests, to
+    show how much time was spent waiting on the network.
+
+Time of functions with several callers is split between the stacks
+in the folded file proportionally to cumulative time of the callers.
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+
+import cProfile
+import functools
+import inspect
+import os.path
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+TOP_N = 15
+MAX_STACK_DEPTH = 64
+# keep only the heaviest stacks leading to each function
+MAX_STACKS_PER_FUNCTION = 50
+
+
+class Profiler:
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.profile = cProfile.Profile()
+        # profiles of other threads, see method start_thread()
+        self.thread_profiles = []
+        # dict from name of function to list [calls, wall seconds, CPU seconds]
+        self.timings = {}
+        self.lock = threading.Lock()
+        self.hooked = []
+        self.wall_start = None
+        self.cpu_start = None
+
+    def record(self, name: str, wall: float, cpu: float):
+        with self.lock:
+            t = self.timings.setdefault(name, [0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += wall
+            t[2] += cpu
+
+    def timed(self, name: str, f):
+        """
+        Wrap function 'f' to record its wall-clock and CPU time.
+        CPU time is per thread, so functions in worker threads are measured correctly.
+        """
+        if inspect.isgeneratorfunction(f):
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                gen = f(*args, **kwargs)
+                while True:
+                    wall, cpu = time.perf_counter(), time.thread_time()
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        self.record(name, time.perf_counter() - wall, time.thread_time() - cpu)
+                    yield item
+        else:
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                wall, cpu = time.perf_counter(), time.thread_time()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - wall, time.thread_time() - cpu)
+        return wrapper
+
+    def hook(self, namespace, names: list):
+        """
+        Replace functions 'names' in 'namespace' (a dict of globals or
+        a module) with timed wrappers, until stop() is called.
+        """
+        is_dict = isinstance(namespace, dict)
+        for name in names:
+            f = namespace[name] if is_dict else getattr(namespace, name)
+            label = name if is_dict else '{}.{}'.format(namespace.__name__, name)
+            wrapper = self.timed(label, f)
+            if is_dict:
+                namespace[name] = wrapper
+            else:
+                setattr(namespace, name, wrapper)
+            self.hooked.append((namespace, name, f))
+
+    def start_thread(self, frame, event, arg):
+        """
+        Called by threading.setprofile() in each new thread: replaces itself
+        with a separate profile of the thread.
+        """
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # since Python 3.12, only one profile can be active at a time
+            return
+        with self.lock:
+            self.thread_profiles.append(profile)
+
+    def start(self):
+        tracemalloc.start()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        threading.setprofile(self.start_thread)
+        self.profile.enable()
+
+    def stop(self, output):
+        """
+        Stop profiling, write results to files and print a summary with
+        function 'output'.
+        """
+        self.profile.disable()
+        threading.setprofile(None)
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        for namespace, name, f in reversed(self.hooked):
+            if isinstance(namespace, dict):
+                namespace[name] = f
+            else:
+                setattr(namespace, name, f)
+        self.hooked = []
+
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            for profile in self.thread_profiles:
+                stats.add(profile)
+        stats.dump_stats(self.prefix + '.prof')
+        with open(self.prefix + '.folded', 'w', encoding='utf-8') as f:
+            for stack, seconds in sorted(folded_stacks(stats).items()):
+                micros = int(seconds * 1e6)
+                if micros > 0:
+                    f.write('{} {}\n'.format(stack, micros))
+
+        output("Profile: wall <<white>>{:.3f}<<default>> s, CPU {:.3f} s, peak traced memory {:.1f} MiB."
+            .format(wall, cpu, peak / (1 << 20)))
+        output("Wrote '{0}.prof' and '{0}.folded', with {1} threads.".format(self.prefix, 1 + len(self.thread_profiles)))
+        output("Wall vs CPU:")
+        output("  {:>7} {:>10} {:>10} {:>6}  {}".format('calls', 'wall, s', 'CPU, s', 'CPU %', 'function'))
+        for name, (calls, w, c) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            output("  {:>7} {:>10.3f} {:>10.3f} {:>6.0f}  {}".format(calls, w, c, 100 * c / w if w else 0, name))
+        output("Top {} functions by cumulative time:".format(TOP_N))
+        output("  {:>7} {:>10} {:>10}  {}".format('calls', 'own, s', 'total, s', 'function'))
+        rows = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:TOP_N]
+        for func, (cc, nc, tt, ct, callers) in rows:
+            output("  {:>7} {:>10.3f} {:>10.3f}  {}".format(nc, tt, ct, label(func)))
+
+
+def label(func) -> str:
+    filename, line, name = func
+    if filename == '~':
+        # built-in function
+        return name.replace(';', ',')
+    return '{} ({}:{})'.format(name, os.path.basename(filename), line).replace(';', ',')
+
+
+def folded_stacks(stats) -> dict:
+    """
+    Convert caller-callee statistics of pstats into folded stacks.  Own time
+    of each function is distributed over its callers proportionally to the
+    cumulative time spent in calls from each caller.
+    """
+    cache = {}
+
+    def stacks(func, visiting):
+        if func in cache:
+            return cache[func]
+        callers = stats.stats[func][4]
+        total = sum(c[3] for c in callers.values())
+        result = []
+        if not callers or total <= 0 or len(visiting) >= MAX_STACK_DEPTH:
+            result = [((label(func),), 1.0)]
+        else:
+            visiting = visiting | {func}
+            for caller, (cc, nc, tt, ct) in callers.items():
+                if caller in visiting or caller not in stats.stats:
+                    continue
+                for stack, share in stacks(caller, visiting):
+                    result.append((stack + (label(func),), share * ct / total))
+            if not result:
+                result = [((label(func),), 1.0)]
+            elif len(result) > MAX_STACKS_PER_FUNCTION:
+                result = sorted(result, key=lambda r: -r[1])[:MAX_STACKS_PER_FUNCTION]
+                kept = sum(r[1] for r in result)
+                result = [(stack, share / kept) for stack, share in result]
+        cache[func] = result
+        return result
+
+    folded = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if tt <= 0:
+            continue
+        for stack, share in stacks(func, frozenset()):
+            key = ';'.join(stack)
+            folded[key] = folded.get(key, 0.0) + tt * share
+    return folded
@@ -13,10 +13,29 @@ Parameters:
 
 -nodownload     If used, do not download fresh archive.php.
 
+-schedule       Keep running and check for new comics on a schedule learned from the times when previous comics
+                first appeared (see file 'qc_titles_history.tsv').  Checks are frequent around likely posting
+                hours of each weekday and rare otherwise.  Implies -auto.
+
+-nopurge        Do not purge pages which show comics with changed titles after the update.  By default, such
+                pages are found among pages using the titles module and purged in small batches.
+
+-nofeed         In automatic mode, always download archive.php.  By default, with option -auto the bot first checks
+                QC's RSS feed (or the front page) and downloads the archive only when there is a comic newer than
+                the last uploaded one, or when the last download is older than a day.
+
 -page           Title of the page which should be updated.
 
+-target         Wiki page to update, in format <family>:<code>[:<page>].  Can be used several times to update
+                mirrors and staging wikis from a single parse of the archive.  Page defaults to the value of
+                option -page.  Without this option, page -page on the default site is updated.
+
 -file           File to read new Lua code from.
 
+-profile        Profile the run: write cProfile data to '<prefix>.prof', folded stacks for flame graph tools to
+                '<prefix>.folded', and print peak memory, wall vs CPU time of network and parsing functions,
+                and top functions.  Optional value is the prefix, default is 'qc_titles'.
+
 Example:
 
     python3 pwb.py qc_titles '-summary:extra message'
@@ -53,21 +72,49 @@ from datetime import datetime
 from textwrap import dedent
 import time
 import subprocess
+import json
+import contextlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
 import pywikibot
 import pywikibot.exceptions
 from pywikibot.bot_choice import QuitKeyboardInterrupt
 
+try:
+    # keeps history of downloaded archives, see qc_history.py
+    import qc_history
+except ImportError:
+    qc_history = None
+
 
 DEFAULT_PAGE_TITLE = 'Module:QC/titles'
 SOURCE_PAGE = 'archive-list.php'
 SOURCE_URL = 'https://questionablecontent.net/' + SOURCE_PAGE
+FEED_URL = 'https://www.questionablecontent.net/QCRSS.xml'
+FRONT_PAGE_URL = 'https://www.questionablecontent.net/'
+FEED_STATE_FILE = 'qc_titles_feed.tmp'
+# download full archive at least this often, even if the feed has no new comics
+FULL_CHECK_SECONDS = 60 * 60 * 24
+HISTORY_FILE = 'qc_titles_history.tsv'
+# number of pages per single API request action=purge
+PURGE_BATCH_SIZE = 20
+# seconds to wait between purge requests, to stay under the rate limit
+PURGE_INTERVAL = 5
+# bounds of polling interval of option -schedule
+SCHEDULE_MIN_SECONDS = 60 * 5
+SCHEDULE_MAX_SECONDS = 60 * 60 * 3
+# polling interval of option -schedule, while there is not enough history
+SCHEDULE_DEFAULT_SECONDS = 60 * 30
+SCHEDULE_MIN_HISTORY = 10
 MIN_AUTO_SECONDS = 60 * 10
 MAX_AUTO_SECONDS = 60 * 60 * 6
 DEBUG = False
 if DEBUG:
     MIN_AUTO_SECONDS = 10
     MAX_AUTO_SECONDS = 30
+    SCHEDULE_MIN_SECONDS = 10
+    SCHEDULE_MAX_SECONDS = 60
 
 
 def grep_lua_last_comic(text):
@@ -76,6 +123,13 @@ def grep_lua_last_comic(text):
     return int(last_comic)
 
 
+def parse_lua_titles(text: str) -> dict:
+    """
+    Parse Lua table written by parse_archive() into dict from comic number to title.
+    """
+    return {int(m.group(1)): m.group(2) for m in re.finditer(r'\[([0-9]+)\]="((?:[^"\\]|\\.)*)"', text)}
+
+
 def is_fresh(filename):
     try:
         mt = os.path.getmtime(filename)
@@ -113,7 +167,91 @@ def url(n):
     return 'https://www.questionablecontent.net/view.php?comic=' + str(n)
 
 
-def parse_archive(f: str, output: str = "data.lua"):
+def read_feed_state() -> dict:
+    try:
+        with open(FEED_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_feed_state(state: dict):
+    with open(FEED_STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def poll_newest_comic(state: dict, feed_url: str, regex: str) -> int:
+    """
+    Find the newest comic number on a small page of QC website, using
+    a conditional request with validators from 'state'.
+    Returns None, if the page could not be checked.
+    """
+    key = 'validators ' + feed_url
+    etag, last_modified, newest = state.get(key, ['', '', None])
+    headers = {'User-Agent' : "Magic"}
+    if newest is not None:
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    try:
+        req = urllib.request.Request(feed_url, headers=headers)
+        response = urllib.request.urlopen(req, timeout=10)
+        data = response.read().decode('utf-8', errors='ignore')
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            pywikibot.output("'{}' is not modified.".format(feed_url))
+            return newest
+        pywikibot.error(str(e))
+        return None
+    except (urllib.error.URLError, timeout) as e:
+        pywikibot.error(str(e))
+        return None
+    numbers = [int(n) for n in re.findall(regex, data)]
+    if not numbers:
+        pywikibot.warning("No comic numbers found in '{}'.".format(feed_url))
+        return None
+    newest = max(numbers)
+    state[key] = [response.headers.get('ETag', ''), response.headers.get('Last-Modified', ''), newest]
+    return newest
+
+
+def has_new_comic(state: dict) -> bool:
+    """
+    Check cheaply, whether the full archive needs to be downloaded.  It is
+    needed when the RSS feed or the front page has a comic newer than the
+    last uploaded one, or when the last full download is too old.
+    """
+    try:
+        age = time.time() - os.path.getmtime(SOURCE_PAGE)
+    except OSError:
+        return True
+    if age > FULL_CHECK_SECONDS:
+        pywikibot.output("Last full check was {:.0f} hours ago.".format(age / 3600))
+        return True
+    uploaded = state.get('uploaded')
+    if uploaded is None:
+        return True
+    newest = poll_newest_comic(state, FEED_URL, r'view\.php\?comic=([0-9]+)')
+    if newest is None:
+        newest = poll_newest_comic(state, FRONT_PAGE_URL, r'comics/([0-9]+)\.(?:png|gif|jpg)')
+    write_feed_state(state)
+    if newest is None:
+        return True
+    pywikibot.output("Newest comic is <<lightgreen>>{}<<default>>, last uploaded is {}.".format(newest, uploaded))
+    if newest > uploaded:
+        record_first_seen(newest)
+        return True
+    return False
+
+
+def parse_archive(f: str, output: str = "data.lua") -> dict:
+    """
+    Parse archive page 'f' and write Lua table of titles to file 'output'.
+
+    Returns dict from comic number to title as published in the archive,
+    before the fixes of known issues.
+    """
     ls = []
     with open(f, encoding='utf-8', errors='ignore') as tmp:
         ls = tmp.readlines()
@@ -157,6 +295,8 @@ def parse_archive(f: str, output: str = "data.lua"):
         if n not in m:
             pywikibot.output("Missing comic <<red>>#{}<<default>>.".format(n))
 
+    raw_titles = dict(m)
+
     # fix known issues of the archive.php page
     ## missing in archive.php
     m[570] = "She Missed It All"
@@ -232,6 +372,7 @@ def parse_archive(f: str, output: str = "data.lua"):
         -- [[Category:Lua modules]]"""))
 
     pywikibot.output("Lua module is ready in file '{}'.".format(output))
+    return raw_titles
 
 
 def put_text(page, new, summary, count, asynchronous=False):
@@ -267,29 +408,79 @@ def put_text(page, new, summary, count, asynchronous=False):
     return False
 
 
-def update_titles(new_data_file: str, want_download: bool, page_title: str, extra_summary: str,
-        automatic: bool) -> bool:
+class Target:
     """
-    Perform a single update of page 'page_title' using 'archive.php' of QC website.
+    A page on a wiki which should be updated with the parsed titles.
+    Keeps its own diff, edit summary, retry state, and result.
+    """
+
+    def __init__(self, site, page_title):
+        self.site = site
+        self.page_title = page_title
+        self.page = None
+        self.old_text = None
+        self.new_text = None
+        self.summary = None
+        self.error_count = 0
+        # None while the update is pending, True on success, False on failure
+        self.result = None
+        # set when the page cannot be updated at all, e.g. it doesn't exist
+        self.skipped = False
+        # purge pages which show changed titles after a successful save
+        self.purge = True
+
+    def __str__(self):
+        return '{}:{}'.format(self.site, self.page_title)
+
+
+def parse_target(value: str, default_page_title: str) -> Target:
+    """
+    Parse value of option '-target' in format <family>:<code>[:<page>].
+    """
+    family, sep, rest = value.partition(':')
+    code, sep, page_title = rest.partition(':')
+    if not family or not code:
+        return None
+    try:
+        site = pywikibot.Site(code, family)
+    except pywikibot.exceptions.Error as e:
+        pywikibot.error(str(e))
+        return None
+    return Target(site, page_title or default_page_title)
+
+
+def prepare_new_text(new_data_file: str, want_download: bool, force_download: bool = False) -> str:
+    """
+    Download and parse 'archive.php' of QC website, if needed.  With
+    'force_download', a fresh local copy of the archive is not reused.
+    Returns Lua code for the titles page or None.
     """
     if want_download:
-        if is_fresh(SOURCE_PAGE):
+        downloaded = False
+        if not force_download and is_fresh(SOURCE_PAGE):
             pywikibot.output("Found fresh file '{}'".format(SOURCE_PAGE))
             with open(SOURCE_PAGE, 'r', encoding='utf-8', errors='ignore') as f:
                 data = f.read()
         else:
             data = download(SOURCE_URL, SOURCE_PAGE)
+            downloaded = True
         if data is None:
             pywikibot.error("Could not download '{}'.".format(SOURCE_PAGE))
-            return False
+            return None
         if DEBUG:
             lines = data.splitlines()
             print(lines[140:150])
-        parse_archive(SOURCE_PAGE, new_data_file)
+        raw_titles = parse_archive(SOURCE_PAGE, new_data_file)
+        if downloaded and qc_history is not None:
+            # history is optional, it must not stop the update of titles
+            try:
+                with contextlib.closing(qc_history.connect(qc_history.DEFAULT_DB)) as db:
+                    snapshot_id = qc_history.record(db, data, raw_titles)
+                pywikibot.output("Archive snapshot <<white>>{}<<default>> in '{}'.".format(
+                    snapshot_id, qc_history.DEFAULT_DB))
+            except (sqlite3.Error, OSError) as e:
+                pywikibot.warning("Could not record archive in '{}': {}".format(qc_history.DEFAULT_DB, e))
 
-    site = pywikibot.Site()
-    page = pywikibot.Page(site, page_title)
-    old_text = page.get()
     new_text = None
     try:
         with open(new_data_file, 'r', encoding='utf-8') as f:
@@ -298,25 +489,46 @@ def update_titles(new_data_file: str, want_download: bool, page_title: str, extr
         pass
     if new_text is None:
         pywikibot.error("Could not read new text to upload. Aborting.")
-        return False
+    return new_text
+
+
+def load_target(target: Target, new_text: str):
+    """
+    Fetch current text of the target page. Safe to run in a worker thread.
+    """
+    target.result = None
+    target.error_count = 0
+    target.page = pywikibot.Page(target.site, target.page_title)
+    target.old_text = target.page.get()
+    username = target.site.username()
+    target.new_text = '-- Updated by {}\n'.format(username) + new_text.rstrip()
 
+
+def review_target(target: Target, extra_summary: str, automatic: bool) -> bool:
+    """
+    Show what will happen to the target page and ask for confirmation.
+    Returns True, if the target should be saved.
+    """
+    old_text = target.old_text
+    new_text = target.new_text
     old_last = grep_lua_last_comic(old_text)
     new_last = grep_lua_last_comic(new_text)
 
     # report what will happen
+    pywikibot.output("Target <<white>>{}<<default>>:".format(target))
     pywikibot.output("Old version goes till <<lightred>>{}<<default>>.".format(old_last))
     pywikibot.output("New version goes till <<lightgreen>>{}<<default>>.".format(new_last))
-    username = site.username()
-    new_text = '-- Updated by {}\n'.format(username) + new_text.rstrip()
 
     # check if the edit is sensible
     if old_text == new_text:
         pywikibot.output("No changes. Nothing to do.")
-        return True
+        target.result = True
+        return False
     if old_last >= new_last and old_text == new_text:
         pywikibot.output("Current version already has {0}." \
                 .format(new_last) + " Nothing to do.")
-        return True
+        target.result = True
+        return False
 
     pywikibot.showDiff(old_text, new_text)
 
@@ -332,6 +544,7 @@ def update_titles(new_data_file: str, want_download: bool, page_title: str, extr
             extra_summary = pywikibot.input("Please add extra summary message:")
     if extra_summary:
         summary = summary + " ({})".format(extra_summary)
+    target.summary = summary
     pywikibot.output("Summary will be" +
         "\n\t<<lightblue>>{}<<default>>".format(summary))
 
@@ -348,17 +561,191 @@ def update_titles(new_data_file: str, want_download: bool, page_title: str, extr
 
     if choice == 'n':
         pywikibot.output("Okay, doing nothing.")
+        target.result = False
         return False
     elif choice == 'b':
-        pywikibot.bot.open_webbrowser(page)
-    elif choice == 'y':
-        error_count = 0
-        while True:
-            result = put_text(page, new_text, summary, error_count)
-            if result is not None:
-                return result
-            error_count += 1
+        pywikibot.bot.open_webbrowser(target.page)
+        target.result = False
+        return False
+    return True
+
+
+def save_target(target: Target) -> bool:
+    """
+    Save the target page, retrying on server errors. Safe to run in a worker thread.
+    """
+    while True:
+        result = put_text(target.page, target.new_text, target.summary, target.error_count)
+        if result is not None:
+            target.result = result
+            if result and target.purge:
+                try:
+                    purge_changed(target)
+                except pywikibot.exceptions.Error as e:
+                    pywikibot.warning("{}: could not purge pages: {}".format(target, e))
+            return result
+        target.error_count += 1
+
+
+def purge_changed(target: Target):
+    """
+    Purge only pages which use comics with corrected titles, instead of waiting
+    for the job queue to re-render every page using Module:QC.
+
+    Scanning the pages costs as much as fetching wikitext of every page which
+    uses the titles module, so it is done only when titles of existing comics
+    have changed.  Newly added comics are left to the job queue: few pages
+    refer to a comic right after it is published.
+    """
+    old_titles = parse_lua_titles(target.old_text)
+    new_titles = parse_lua_titles(target.new_text)
+    changed = {n for n in old_titles.keys() & new_titles.keys() if old_titles[n] != new_titles[n]}
+    changed |= old_titles.keys() - new_titles.keys()
+    if not changed:
+        return
+    # comic numbers in QC templates, like {{QC|1234}}, {{qc|1234|text}}, or {{#invoke:QC|qc|1234}}
+    param_regex = re.compile(r'\{\{\s*(?:[Qq][Cc]|#invoke:\s*QC\s*\|[^|{}]*)\s*\|\s*0*([1-9][0-9]*)\s*[|}]')
+    users = target.page.embeddedin(content=False)
+    affected = []
+    for page in target.site.preloadpages(users, groupsize=50):
+        numbers = {int(n) for n in param_regex.findall(page.text)}
+        if numbers & changed:
+            affected.append(page)
+    pywikibot.output("{}: titles of {} comics changed, purging {} pages.".format(
+        target, len(changed), len(affected)))
+    for i in range(0, len(affected), PURGE_BATCH_SIZE):
+        if i > 0:
+            time.sleep(PURGE_INTERVAL)
+        batch = affected[i:i + PURGE_BATCH_SIZE]
+        if not target.site.purgepages(batch, forcelinkupdate=True):
+            pywikibot.warning("{}: could not purge {}".format(target, ', '.join(p.title() for p in batch)))
+
+
+def read_history() -> dict:
+    """
+    Returns dict from comic number to datetime when the bot first saw it.
+    """
+    history = {}
+    try:
+        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                num, sep, seen = line.strip().partition('\t')
+                try:
+                    history[int(num)] = datetime.fromisoformat(seen)
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return history
+
+
+def record_first_seen(num: int):
+    history = read_history()
+    if history and num <= max(history):
+        return
+    with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+        f.write('{}\t{}\n'.format(num, datetime.now().isoformat(timespec='seconds')))
+
+
+def poll_interval(weights: list, weekday: int, hour: int) -> float:
+    """
+    Polling interval for given hour of the week: short around likely
+    posting windows, long otherwise.
+    """
+    w = weights[weekday * 24 + hour] / max(weights)
+    return SCHEDULE_MAX_SECONDS - (SCHEDULE_MAX_SECONDS - SCHEDULE_MIN_SECONDS) * w
+
+
+def next_poll_seconds(history: dict, now: datetime) -> float:
+    """
+    Number of seconds until the next check for new comics.
+
+    Times when new comics appeared in the past are counted per weekday and
+    hour, with Laplace smoothing and spread to neighbouring hours, which
+    gives the probability of a new comic being posted in every hour of
+    the week.
+    """
+    if len(history) < SCHEDULE_MIN_HISTORY:
+        return SCHEDULE_DEFAULT_SECONDS
+    counts = [1.0] * (7 * 24)
+    for seen in history.values():
+        slot = seen.weekday() * 24 + seen.hour
+        counts[slot] += 2
+        counts[(slot - 1) % len(counts)] += 1
+        counts[(slot + 1) % len(counts)] += 1
+    total = sum(counts)
+    weights = [c / total for c in counts]
+    interval = poll_interval(weights, now.weekday(), now.hour)
+    # don't sleep through the start of any more likely hour within the interval
+    hour_start = now.replace(minute=0, second=0, microsecond=0).timestamp() + 3600
+    while hour_start - now.timestamp() < interval:
+        slot = datetime.fromtimestamp(hour_start)
+        if poll_interval(weights, slot.weekday(), slot.hour) < interval:
+            interval = hour_start - now.timestamp()
+            break
+        hour_start += 3600
+    return max(interval, 1)
+
+
+def update_titles(new_data_file: str, want_download: bool, targets: list, extra_summary: str,
+        automatic: bool, use_feed: bool = False) -> bool:
+    """
+    Perform a single update of all pending 'targets' using 'archive.php' of QC website.
+
+    The archive is downloaded and parsed once.  Pages are fetched and saved
+    concurrently, while diffs are reviewed one target at a time.
+    """
+    state = read_feed_state()
+    retrying = any(t.result is not None for t in targets)
+    feed_checked = want_download and use_feed and not retrying
+    if feed_checked and not has_new_comic(state):
+        pywikibot.output("No new comics. Nothing to do.")
         return True
+    # the local copy of the archive could be older than the new comic
+    new_text = prepare_new_text(new_data_file, want_download, force_download=feed_checked)
+    if new_text is None:
+        return False
+    uploaded = state.get('uploaded')
+    if uploaded is not None and grep_lua_last_comic(new_text) > uploaded:
+        record_first_seen(grep_lua_last_comic(new_text))
+
+    pending = [t for t in targets if not t.result and not t.skipped]
+    with ThreadPoolExecutor(max_workers=max(1, len(pending))) as pool:
+        loaded = []
+        for target, future in [(t, pool.submit(load_target, t, new_text)) for t in pending]:
+            try:
+                future.result()
+                loaded.append(target)
+            except pywikibot.exceptions.NoPageError:
+                pywikibot.error("{} doesn't exist, skipping.".format(target))
+                target.result = False
+                target.skipped = True
+            except pywikibot.exceptions.IsRedirectPageError:
+                pywikibot.error("{} is a redirect, skipping.".format(target))
+                target.result = False
+                target.skipped = True
+            except pywikibot.exceptions.Error as e:
+                # e.g. API error or timeout of one wiki, retry only this target
+                pywikibot.error("Could not load {}: {}".format(target, e))
+                target.result = False
+
+        accepted = [t for t in loaded if review_target(t, extra_summary, automatic)]
+        for target, future in [(t, pool.submit(save_target, t)) for t in accepted]:
+            try:
+                future.result()
+            except pywikibot.exceptions.Error as e:
+                pywikibot.error("Could not save {}: {}".format(target, e))
+                target.result = False
+
+    for target in pending:
+        pywikibot.output("{}: {}".format(target,
+            "<<lightgreen>>success<<default>>" if target.result else "<<lightred>>failure<<default>>"))
+    # skipped targets count as failures, 'uploaded' is recorded only when every target is up to date
+    updated = all(t.result and not t.skipped for t in targets)
+    if updated:
+        state['uploaded'] = grep_lua_last_comic(new_text)
+        write_feed_state(state)
+    return updated
 
 
 def notify_user():
@@ -420,7 +807,35 @@ def main(*args):
 
     pywikibot.output("Start: <<white>>{}<<default>>".format(datetime.now()))
 
+    started = time.perf_counter()
+    started_cpu = time.process_time()
     local_args = pywikibot.handle_args(args)
+    profile_prefix = None
+    for arg in local_args:
+        option, sep, value = arg.partition(':')
+        if option == '-profile':
+            profile_prefix = value or 'qc_titles'
+    if profile_prefix is None:
+        return run(local_args)
+
+    # imported only here, so that there is no overhead without option -profile
+    import qc_profile
+    profiler = qc_profile.Profiler(profile_prefix)
+    profiler.record('pywikibot.handle_args', time.perf_counter() - started, time.process_time() - started_cpu)
+    profiler.hook(globals(), ['download', 'parse_archive', 'poll_newest_comic', 'load_target', 'review_target',
+        'save_target', 'put_text', 'purge_changed'])
+    profiler.hook(pywikibot, ['Site', 'showDiff', 'input', 'input_choice'])
+    profiler.start()
+    try:
+        return run(local_args)
+    finally:
+        profiler.stop(pywikibot.output)
+
+
+def run(local_args):
+    """
+    Invoke bot with command line arguments, which were not handled by Pywikibot.
+    """
 
     # default values for options
     new_data_file = 'data.lua'
@@ -428,6 +843,10 @@ def main(*args):
     page_title = DEFAULT_PAGE_TITLE
     extra_summary = None
     automatic = False
+    use_feed = True
+    scheduled = False
+    want_purge = True
+    target_values = []
 
     for arg in local_args:
         option, sep, value = arg.partition(':')
@@ -441,6 +860,17 @@ def main(*args):
             extra_summary = value
         elif option == '-auto':
             automatic = True
+        elif option == '-schedule':
+            automatic = True
+            scheduled = True
+        elif option == '-nopurge':
+            want_purge = False
+        elif option == '-nofeed':
+            use_feed = False
+        elif option == '-target':
+            target_values.append(value)
+        elif option == '-profile':
+            pass
         else:
             pywikibot.warning("Unrecognized option {}".format(option))
 
@@ -459,41 +889,65 @@ def main(*args):
     if automatic and not want_download:
         pywikibot.error("Flags -auto and -nodownload are not compatible.")
         return False
+    targets = []
+    for value in target_values:
+        target = parse_target(value, page_title)
+        if target is None:
+            pywikibot.error("Wrong format of option '-target:{}'. Aborting.".format(value))
+            return False
+        targets.append(target)
+    if not targets:
+        targets.append(Target(pywikibot.Site(), page_title))
+    for target in targets:
+        target.purge = want_purge
     if want_download:
         pywikibot.output("Will download '{}'.".format(SOURCE_PAGE))
-    pywikibot.output("Will edit page '{}'.".format(page_title))
+    for target in targets:
+        pywikibot.output("Will edit page '{}'.".format(target))
 
     try:
-        sleep_on_error_seconds = MIN_AUTO_SECONDS
         while True:
-            updated = update_titles(new_data_file, want_download, page_title, extra_summary, automatic)
-            if updated:
-                pywikibot.output("Update successful.")
-                with open('qc_titles_success.tmp', 'w') as f:
+            sleep_on_error_seconds = MIN_AUTO_SECONDS
+            while True:
+                updated = update_titles(new_data_file, want_download, targets, extra_summary, automatic,
+                        use_feed and automatic)
+                if updated:
+                    pywikibot.output("Update successful.")
+                    with open('qc_titles_success.tmp', 'w') as f:
+                        f.write(str(datetime.now()))
+                    break
+                pywikibot.error("Could not update.")
+                with open('qc_titles_failure.tmp', 'w') as f:
                     f.write(str(datetime.now()))
+                notify_user()
+                if all(t.result or t.skipped for t in targets):
+                    # retrying cannot help pages which don't exist or are redirects
+                    pywikibot.error("Pages {} cannot be updated, abort!".format(
+                        ', '.join(str(t) for t in targets if t.skipped)))
+                    return False
+                pywikibot.output("Sleeping for {} seconds.".format(sleep_on_error_seconds))
+                try:
+                    time.sleep(sleep_on_error_seconds)
+                    # after using current value of sleep_on_error_seconds, increase it until max
+                    sleep_on_error_seconds *= 2
+                    if sleep_on_error_seconds > MAX_AUTO_SECONDS:
+                        sleep_on_error_seconds = MAX_AUTO_SECONDS
+                except KeyboardInterrupt:
+                    pywikibot.output("Sleep interrupted by user. Proceeding to next update.")
+            if not scheduled:
                 break
-            pywikibot.error("Could not update.")
-            with open('qc_titles_failure.tmp', 'w') as f:
-                f.write(str(datetime.now()))
-            notify_user()
-            pywikibot.output("Sleeping for {} seconds.".format(sleep_on_error_seconds))
+            sleep_seconds = next_poll_seconds(read_history(), datetime.now())
+            pywikibot.output("Next check at <<white>>{}<<default>>.".format(
+                datetime.fromtimestamp(time.time() + sleep_seconds)))
             try:
-                time.sleep(sleep_on_error_seconds)
-                # after using current value of sleep_on_error_seconds, increase it until max
-                sleep_on_error_seconds *= 2
-                if sleep_on_error_seconds > MAX_AUTO_SECONDS:
-                    sleep_on_error_seconds = MAX_AUTO_SECONDS
+                time.sleep(sleep_seconds)
             except KeyboardInterrupt:
                 pywikibot.output("Sleep interrupted by user. Proceeding to next update.")
+            for target in targets:
+                target.result = None
     except KeyboardInterrupt:
         pywikibot.output("Interrupted by user. Aborting.")
         return False
-    except pywikibot.exceptions.NoPageError:
-        pywikibot.error("{} doesn't exist, abort!".format(page.title()))
-        return False
-    except pywikibot.exceptions.IsRedirectPageError:
-        pywikibot.error("{} is a redirect, abort!".format(page.title()))
-        return False
     except pywikibot.exceptions.Error as e:
         pywikibot.bot.suggest_help(exception=e)
         return False
@@ -0,0 +1,293 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+r"""
+This bot uploads comic images downloaded by 'crawler/crawl.sh', which are not
+yet on the wiki.
+
+Local images are hashed in parallel.  SHA-1 hashes of all files on the wiki
+are requested in batches with API query list=allimages, and only images with
+unknown hashes are uploaded, with filled in templates {{QC image}} and
+{{Fairuse}}.  Comics with identical images are uploaded only once, for the
+first of them.  Uploads run concurrently, spaced by the put throttle of
+pywikibot.
+
+Parameters:
+
+-dir            Directory with output of crawl.sh.  Default is current directory.
+
+-packs          Directory with images packed by crawler/qc_pack.py, which
+                must be on the module search path.  Loose images in -dir
+                take precedence over packed ones.
+
+-from           Number of the first comic to upload.
+
+-to             Number of the last comic to upload.
+
+-titles         Lua file with comic titles, produced by qc_titles.py, for descriptions of images.
+
+-name           Format of file names on the wiki, with fields {num} and {ext}.  Default is 'Comic {num}.{ext}'.
+
+-workers        Number of concurrent uploads.  Default is 2.
+
+-interval       Minimum number of seconds between two uploads.  Same as global
+                option -putthrottle, default is put_throttle from user-config.py.
+
+-summary        Extra message to add to the upload summary.
+
+-auto           Do not ask for confirmation before uploading.
+
+Example:
+
+    python3 pwb.py qc_upload -dir:/path/to/crawl/output -from:5600
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+# Usage: same as qc_titles.py, see instructions there.
+#
+
+import sys
+import re
+import os
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from textwrap import dedent
+
+import pywikibot
+import pywikibot.exceptions
+from pywikibot.bot_choice import QuitKeyboardInterrupt
+from pywikibot.data import api
+
+try:
+    import qc_pack
+except ImportError:
+    qc_pack = None
+
+
+DEFAULT_NAME_FORMAT = 'Comic {num}.{ext}'
+DEFAULT_WORKERS = 2
+# number of files, for which hashes are requested from the API at once
+API_BATCH_SIZE = 500
+image_name_regex = re.compile('([0-9]{4,})\\.(png|gif|jpg)$')
+lua_item_regex = re.compile(r'^\[([0-9]+)\]="((?:[^"\\]|\\.)*)",?$')
+
+
+def find_images(directory, first, last):
+    """
+    Returns dict from comic number to path of its image.
+    """
+    images = {}
+    for entry in sorted(os.listdir(directory)):
+        subdir = os.path.join(directory, entry)
+        if not entry.isdigit() or not os.path.isdir(subdir):
+            continue
+        for filename in os.listdir(subdir):
+            m = image_name_regex.match(filename)
+            if not m:
+                continue
+            num = int(m.group(1))
+            path = os.path.join(subdir, filename)
+            if first <= num <= last and os.path.getsize(path) > 0:
+                images[num] = path
+    return images
+
+
+def find_packed_images(store, first, last):
+    """
+    Returns dict from comic number to tuple (extension, SHA-1) of packed images.
+    """
+    return {num: (ext, sha1) for num, ext, size, sha1 in store.records() if first <= num <= last}
+
+
+def sha1_of_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_titles(filename):
+    titles = {}
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            m = lua_item_regex.match(line.strip())
+            if m:
+                titles[int(m.group(1))] = m.group(2).replace('\\"', '"')
+    return titles
+
+
+def wiki_hashes(site):
+    """
+    Returns set of SHA-1 hashes of all files on the wiki.
+    """
+    gen = api.ListGenerator('allimages', site=site, parameters={'aiprop': 'sha1'})
+    gen.set_query_increment(API_BATCH_SIZE)
+    return {item['sha1'] for item in gen}
+
+
+def upload(site, num, path, name_format, description, summary):
+    """
+    Upload a single image. Runs in a worker thread.  The rate of uploads
+    is limited by the thread-safe put throttle of the site.
+    """
+    ext = path.rsplit('.', 1)[1]
+    page = pywikibot.FilePage(site, 'File:' + name_format.format(num=num, ext=ext))
+    text = dedent("""
+        == Summary ==
+        {{{{QC image|{0}|{1}}}}}
+
+        == Licensing ==
+        {{{{Fairuse}}}}
+        """.format(description, num)).strip()
+    try:
+        return site.upload(page, source_filename=path, comment=summary, text=text,
+                           ignore_warnings=False, report_success=False)
+    except pywikibot.exceptions.Error as e:
+        pywikibot.error("Could not upload {}: {}".format(page.title(), e))
+        return False
+
+
+def upload_packed(store, site, num, ext, *args):
+    """
+    Unpack image into a temporary file and upload it. Runs in a worker thread.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, '{}.{}'.format(num, ext))
+        view = store.get(num)
+        try:
+            with open(path, 'wb') as f:
+                f.write(view)
+        finally:
+            view.release()
+        return upload(site, num, path, *args)
+
+
+def main(*args):
+    """
+    Process command line arguments and invoke bot.
+
+    If args is an empty list, sys.argv is used.
+
+    @param args: command line arguments
+    @type args: str
+    """
+
+    local_args = pywikibot.handle_args(args)
+
+    # default values for options
+    directory = '.'
+    packs_directory = None
+    first = 1
+    last = sys.maxsize
+    titles_file = None
+    name_format = DEFAULT_NAME_FORMAT
+    workers = DEFAULT_WORKERS
+    interval = None
+    extra_summary = None
+    automatic = False
+
+    try:
+        for arg in local_args:
+            option, sep, value = arg.partition(':')
+            if option == '-dir':
+                directory = value
+            elif option == '-packs':
+                packs_directory = value
+            elif option == '-from':
+                first = int(value)
+            elif option == '-to':
+                last = int(value)
+            elif option == '-titles':
+                titles_file = value
+            elif option == '-name':
+                name_format = value
+            elif option == '-workers':
+                workers = int(value)
+            elif option == '-interval':
+                interval = float(value)
+            elif option == '-summary':
+                extra_summary = value
+            elif option == '-auto':
+                automatic = True
+            else:
+                pywikibot.warning("Unrecognized option {}".format(option))
+    except ValueError as e:
+        pywikibot.error("Wrong value of option: {}".format(e))
+        return False
+
+    if packs_directory and qc_pack is None:
+        pywikibot.error("Option -packs requires qc_pack.py from directory crawler.")
+        return False
+
+    titles = read_titles(titles_file) if titles_file else {}
+    images = find_images(directory, first, last)
+    pywikibot.output("Hashing {} images...".format(len(images)))
+    # hashlib releases the GIL on large inputs, so threads hash in parallel
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        hashes = dict(zip(images, pool.map(sha1_of_file, images.values())))
+    store = None
+    packed = {}
+    if packs_directory:
+        # opens all packs, before worker threads use them
+        store = qc_pack.PackStore(packs_directory)
+        packed = {num: info for num, info in find_packed_images(store, first, last).items() if num not in images}
+        pywikibot.output("Found {} packed images.".format(len(packed)))
+        for num, (ext, sha1) in packed.items():
+            hashes[num] = sha1
+
+    if interval is not None:
+        pywikibot.config.put_throttle = interval
+    site = pywikibot.Site()
+    existing = wiki_hashes(site)
+    pywikibot.output("Wiki has <<aqua>>{}<<default>> files.".format(len(existing)))
+    # upload identical images only once, for the first comic
+    first_of_hash = {}
+    for num in sorted(hashes):
+        first_of_hash.setdefault(hashes[num], num)
+    missing = sorted(num for sha1, num in first_of_hash.items() if sha1 not in existing)
+    if not missing:
+        pywikibot.output("All images are already uploaded. Nothing to do.")
+        return True
+    pywikibot.output("Missing images: {}".format(', '.join(map(str, missing))))
+
+    summary = "upload comic image ([[User:AndrybakBot#Image maintenance|Image maintenance bot task]])"
+    if extra_summary:
+        summary = summary + " ({})".format(extra_summary)
+    try:
+        if not automatic:
+            choice = pywikibot.input_choice(
+                "Do you want to upload {} images?".format(len(missing)),
+                [('Yes', 'y'), ('No', 'n')], 'n')
+            if choice == 'n':
+                pywikibot.output("Okay, doing nothing.")
+                return False
+    except QuitKeyboardInterrupt:
+        sys.exit("User quit bot run.")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for num in missing:
+            args = (name_format, titles.get(num, 'Comic {}'.format(num)), summary)
+            if num in packed:
+                future = pool.submit(upload_packed, store, site, num, packed[num][0], *args)
+            else:
+                future = pool.submit(upload, site, num, images[num], *args)
+            futures.append((num, future))
+        failed = [num for num, future in futures if not future.result()]
+    if store is not None:
+        store.close()
+    if failed:
+        pywikibot.error("Could not upload images of comics {}".format(', '.join(map(str, failed))))
+        return False
+    pywikibot.output("Uploaded {} images.".format(len(missing)))
+    return True
+
+
+if __name__ == '__main__':
+    main()
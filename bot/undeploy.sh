@@ -3,8 +3,10 @@
 source config.sh
 
 set -u
-filename='qc_titles.py'
 SRC="${BOT_LOCATION}/scripts/userscripts"
 DEST="."
 
-source overwrite.sh
+for filename in 'qc_titles.py' 'qc_history.py' 'qc_profile.py'
+do
+	(source overwrite.sh)
+done
@@ -3,6 +3,14 @@
 #
 # Script to download all comic views from http://questionablecontent.net/
 #
+# If PACK_DIR is set, images are stored in packs, see qc_pack.py.
+# Comics listed in file redownload.txt by qc_verify.py are downloaded again,
+# even if they are packed.
+# If MANIFEST is set, present images are listed in it, see qc_shard.py.
+# If SHARD is set, other workers crawl in the same directory at the same time:
+# only queued comics from FROM .. LAST are downloaded, and only comics from
+# this run are packed.
+#
 
 LAST=${2:-$(grep -m 1 -o '[1-9][0-9]*' ../core_stable/data.lua | head -1 || echo "5000")}
 let FROM=${1:-${LAST}-300}
@@ -12,11 +20,56 @@ START=$(date)
 echo "Started: $START"
 root_url='https://www.questionablecontent.net'
 
-for i in $(seq $FROM $LAST)
+# extension, size, and SHA-1 of packed images
+declare -A packed
+if [[ -n "${PACK_DIR:-}" ]]
+then
+	pack_tool="$(dirname "$0")/qc_pack.py"
+	while IFS=$'\t' read n ext size sha1
+	do
+		packed[$n]="$ext"$'\t'"$size"$'\t'"$sha1"
+	done < <(python3 "$pack_tool" -p "$PACK_DIR" list -l)
+	echo "Found ${#packed[@]} packed comics in '$PACK_DIR'"
+fi
+
+# download URL $1 into file $2, removing partial or error output on failure
+fetch() {
+	curl --fail "$1" -o "$2" || { rm -f "$2"; false; }
+}
+
+QUEUE='redownload.txt'
+declare -A queued
+# queued comics outside of FROM .. LAST
+extra=()
+for n in $(sort -nu "$QUEUE" 2>/dev/null)
+do
+	if (( FROM <= n && n <= LAST ))
+	then
+		queued[$n]=1
+	elif [[ -z "${SHARD:-}" ]]
+	then
+		queued[$n]=1
+		extra+=($n)
+	fi
+done
+# comics with downloaded image files, to be packed
+declare -A loose
+
+for i in $(seq $FROM $LAST) "${extra[@]}"
 do
 	DIR=$(printf "%02d" $(( $i / 100 )))
 	z=$(printf "%04d" $i)
 	echo -n "$DIR / $z ($i) - "
+	if [[ -n "${packed[$i]:-}" ]] && [[ -z "${queued[$i]:-}" ]]
+	then
+		echo "OK (packed)"
+		if [[ -n "${MANIFEST:-}" ]]
+		then
+			IFS=$'\t' read ext size sha1 <<< "${packed[$i]}"
+			echo -e "$i\t$PACK_DIR/$DIR.pack:$DIR/$z.$ext\t$size\t$sha1" >> "$MANIFEST"
+		fi
+		continue
+	fi
 	mkdir -p "$DIR"
 
 	file="$DIR/$z.html"
@@ -43,9 +96,9 @@ do
 		echo "OK"
 	else
 		echo "Downloading..."
-		curl "$root_url/comics/$file1" -o "$t1" || \
-			curl "$root_url/comics/$file2" -o "$t2" || \
-			curl "$root_url/comics/$file3" -o "$t3"
+		fetch "$root_url/comics/$file1" "$t1" || \
+			fetch "$root_url/comics/$file2" "$t2" || \
+			fetch "$root_url/comics/$file3" "$t3"
 		if [[ ! -s "$t1" ]] && [[ -f "$t1" ]]
 		then
 			rm "$t1" && echo -n "$t1 is empty - "
@@ -61,7 +114,65 @@ do
 		ls -l "$DIR/$z"*
 		sleep $(( $RANDOM % 5 ))
 	fi
+	for t in "$t1" "$t2" "$t3"
+	do
+		if [[ -s "$t" ]]
+		then
+			loose[$i]=1
+		fi
+	done
+	# with PACK_DIR, images are listed after packing, see below
+	if [[ -n "${MANIFEST:-}" ]] && [[ -z "${PACK_DIR:-}" ]]
+	then
+		for t in "$t1" "$t2" "$t3"
+		do
+			if [[ -s "$t" ]]
+			then
+				echo -e "$i\t$t\t$(stat -c %s "$t")\t$(sha1sum < "$t" | cut -d ' ' -f 1)" >> "$MANIFEST"
+			fi
+		done
+	fi
 done
 
+# keep in the queue only comics which are still not downloaded.  The queue
+# is read again under the lock, because qc_verify.py and other workers
+# could have changed it since the start.
+(
+	flock 9
+	if [[ -f "$QUEUE" ]]
+	then
+		for n in $(sort -nu "$QUEUE")
+		do
+			if [[ -z "${queued[$n]:-}" ]] || [[ -z "${loose[$n]:-}" ]]
+			then
+				echo "$n"
+			fi
+		done > "$QUEUE.tmp"
+		if [[ -s "$QUEUE.tmp" ]]
+		then
+			mv "$QUEUE.tmp" "$QUEUE"
+			echo "Comics left in '$QUEUE': $(wc -l < "$QUEUE")"
+		else
+			rm -f "$QUEUE.tmp" "$QUEUE"
+		fi
+	fi
+) 9> "$QUEUE.lock"
+if [[ -n "${PACK_DIR:-}" ]] && (( ${#loose[@]} > 0 ))
+then
+	printf '%s\n' "${!loose[@]}" | python3 "$pack_tool" -p "$PACK_DIR" add --remove --numbers - .
+	if [[ -n "${MANIFEST:-}" ]]
+	then
+		python3 "$pack_tool" -p "$PACK_DIR" list -l | while IFS=$'\t' read n ext size sha1
+		do
+			if [[ -n "${loose[$n]:-}" ]]
+			then
+				DIR=$(printf "%02d" $(( $n / 100 )))
+				z=$(printf "%04d" $n)
+				echo -e "$n\t$PACK_DIR/$DIR.pack:$DIR/$z.$ext\t$size\t$sha1" >> "$MANIFEST"
+			fi
+		done
+	fi
+fi
+
 echo "Started : $START"
 echo "Finished: $(date)"
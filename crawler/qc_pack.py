@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+r"""
+Packed storage for comic images downloaded by 'crawl.sh'.
+
+Instead of one file per comic 'NN/NNNN.ext', images of each hundred of
+comics are stored in a single pack file 'NN.pack' with index 'NN.idx'.
+Identical images are stored only once per pack.  The index is sorted by
+comic number and consists of fixed-size records, so that a lookup is
+a binary search in a memory-mapped file, without any stat calls.
+
+Index format: 8-byte header b'QCPK' + uint32 count, followed by records
+of struct RECORD (little-endian):
+
+    comic number   uint32
+    offset         uint64    in the pack file
+    length         uint32
+    extension      4 bytes   e.g. b'png\0'
+    SHA-1          20 bytes  of the image
+
+Commands:
+
+    add DIR      pack images from crawl directory DIR, optionally removing
+                 packed files with option --remove, and only comics listed
+                 in file given by option --numbers ('-' for standard input)
+    list         print numbers of all packed comics, with option -l also
+                 extension, size, and SHA-1 of their images
+    has N        exit with status 0 if comic N is packed
+    cat N        write image of comic N to standard output
+
+Several crawlers can add images to the same packs: writes to each pack are
+serialized with a lock on file 'NN.lock'.
+
+Packed images are still checked by 'qc_verify.py --packs' and uploaded by
+'qc_upload.py -packs', which read them through class PackStore.  To replace
+a packed image, download it again with 'crawl.sh' and pack it: the new
+image replaces the old one in the index.
+
+Example:
+
+    python3 qc_pack.py -p /path/to/packs add --remove /path/to/crawl/output
+    python3 qc_pack.py -p /path/to/packs cat 1234 > 1234.png
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+
+import argparse
+import fcntl
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+
+
+HEADER = struct.Struct('<4sI')
+MAGIC = b'QCPK'
+RECORD = struct.Struct('<IQI4s20s')
+image_name_regex = re.compile('([0-9]{4,})\\.(png|gif|jpg)$')
+
+
+def century(num):
+    return '{:02d}'.format(num // 100)
+
+
+class Pack:
+    """
+    Read-only view of a single pack and its index.  Image bytes are
+    returned as memoryview slices of the memory-mapped pack, without copying.
+    """
+
+    def __init__(self, directory, name):
+        self.pack_path = os.path.join(directory, name + '.pack')
+        self.index_path = os.path.join(directory, name + '.idx')
+        self.index = None
+        self.data = None
+        self.count = 0
+        try:
+            with open(self.index_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size > HEADER.size:
+                    self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        if self.index is None:
+            return
+        magic, count = HEADER.unpack_from(self.index, 0)
+        if magic != MAGIC:
+            raise ValueError("'{}' is not a pack index".format(self.index_path))
+        try:
+            with open(self.pack_path, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # index without its pack (or with an empty one) points nowhere
+            print("Ignoring index '{}' without pack '{}'.".format(self.index_path, self.pack_path),
+                file=sys.stderr)
+            self.index.close()
+            self.index = None
+            return
+        self.count = count
+
+    def record(self, i):
+        return RECORD.unpack_from(self.index, HEADER.size + i * RECORD.size)
+
+    def records(self):
+        for i in range(self.count):
+            yield self.record(i)
+
+    def find(self, num):
+        """
+        Binary search for the record of comic 'num'. Returns None if absent.
+        """
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            r = self.record(mid)
+            if r[0] < num:
+                lo = mid + 1
+            elif r[0] > num:
+                hi = mid
+            else:
+                return r
+        return None
+
+    def get(self, num):
+        r = self.find(num)
+        if r is None:
+            return None
+        return memoryview(self.data)[r[1]:r[1] + r[2]]
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        if self.index is not None:
+            self.index.close()
+
+
+class PackStore:
+    """
+    All packs in a directory, opened lazily.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.packs = {}
+
+    def pack(self, num):
+        name = century(num)
+        if name not in self.packs:
+            self.packs[name] = Pack(self.directory, name)
+        return self.packs[name]
+
+    def __contains__(self, num):
+        return self.pack(num).find(num) is not None
+
+    def get(self, num):
+        return self.pack(num).get(num)
+
+    def extension(self, num):
+        r = self.pack(num).find(num)
+        return r[3].rstrip(b'\0').decode('ascii') if r else None
+
+    def records(self):
+        """
+        Yield tuples (number, extension, size, SHA-1 in hex) of all packed images.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(f[:-len('.idx')] for f in os.listdir(self.directory) if f.endswith('.idx')):
+            pack = self.pack(int(name) * 100)
+            for r in pack.records():
+                yield (r[0], r[3].rstrip(b'\0').decode('ascii'), r[2], r[4].hex())
+
+    def numbers(self):
+        for r in self.records():
+            yield r[0]
+
+    def close(self):
+        for pack in self.packs.values():
+            pack.close()
+        self.packs = {}
+
+
+def add_files(directory, name, files):
+    """
+    Add image files to pack 'name', storing each distinct image only once.
+    'files' is a dict from comic number to path.  Returns number of added images.
+    """
+    with open(os.path.join(directory, name + '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return add_files_locked(directory, name, files)
+
+
+def add_files_locked(directory, name, files):
+    old = Pack(directory, name)
+    records = {r[0]: r for r in old.records()}
+    offsets = {r[4]: (r[1], r[2]) for r in records.values()}
+    old.close()
+    added = 0
+    with open(os.path.join(directory, name + '.pack'), 'ab') as pack:
+        end = pack.tell()
+        for num, path in sorted(files.items()):
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha1(data).digest()
+            ext = path.rsplit('.', 1)[1].encode('ascii')
+            if digest not in offsets:
+                pack.write(data)
+                offsets[digest] = (end, len(data))
+                end += len(data)
+            offset, length = offsets[digest]
+            records[num] = (num, offset, length, ext, digest)
+            added += 1
+        pack.flush()
+        os.fsync(pack.fileno())
+    index_path = os.path.join(directory, name + '.idx')
+    tmp = index_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        for num in sorted(records):
+            f.write(RECORD.pack(*records[num]))
+    os.replace(tmp, index_path)
+    return added
+
+
+def find_loose_files(crawl_directory):
+    """
+    Returns dict from pack name to dict from comic number to path.
+    """
+    result = {}
+    for entry in sorted(os.listdir(crawl_directory)):
+        subdir = os.path.join(crawl_directory, entry)
+        if not entry.isdigit() or not os.path.isdir(subdir):
+            continue
+        for filename in os.listdir(subdir):
+            m = image_name_regex.match(filename)
+            path = os.path.join(subdir, filename)
+            if m and os.path.getsize(path) > 0:
+                num = int(m.group(1))
+                result.setdefault(century(num), {})[num] = path
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packed storage for comic images.")
+    parser.add_argument('-p', '--packs', default='packs', help="directory with packs (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="pack images from crawl directory")
+    add.add_argument('directory', nargs='?', default='.')
+    add.add_argument('--remove', action='store_true', help="remove image files after packing")
+    add.add_argument('--numbers', type=argparse.FileType('r'),
+            help="pack only comics with numbers listed in this file, one per line")
+    ls = commands.add_parser('list', help="print numbers of packed comics")
+    ls.add_argument('-l', '--long', action='store_true', help="also print extension, size, and SHA-1")
+    has = commands.add_parser('has', help="check if comic is packed")
+    has.add_argument('num', type=int)
+    cat = commands.add_parser('cat', help="write image of comic to standard output")
+    cat.add_argument('num', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        os.makedirs(args.packs, exist_ok=True)
+        numbers = None
+        if args.numbers:
+            numbers = {int(line) for line in args.numbers if line.strip()}
+        for name, files in find_loose_files(args.directory).items():
+            if numbers is not None:
+                files = {num: path for num, path in files.items() if num in numbers}
+                if not files:
+                    continue
+            added = add_files(args.packs, name, files)
+            print("Pack {}: added {} images.".format(name, added), file=sys.stderr)
+            if args.remove:
+                for path in files.values():
+                    os.remove(path)
+        return 0
+
+    store = PackStore(args.packs)
+    try:
+        if args.command == 'list':
+            for r in store.records():
+                print('\t'.join(map(str, r)) if args.long else r[0])
+        elif args.command == 'has':
+            return 0 if args.num in store else 1
+        elif args.command == 'cat':
+            data = store.get(args.num)
+            if data is None:
+                print("Comic {} is not packed.".format(args.num), file=sys.stderr)
+                return 1
+            sys.stdout.buffer.write(data)
+            data.release()
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,348 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+r"""
+Finds duplicated and misnumbered comic images among files downloaded by
+'crawl.sh' using perceptual hashes.
+
+Each image is reduced to a 64-bit DCT hash (pHash).  Hashes are kept in a
+BK-tree, which allows finding all images within a given Hamming distance
+without comparing every pair of images.  Hashes are cached in file
+'phash.tsv' in the crawl directory, so that on later runs only new or changed
+images are hashed and checked against the index.
+
+With option --packs, images packed by 'qc_pack.py' are hashed too, the same
+as by 'qc_verify.py --packs'.  Loose images take precedence over packed ones.
+
+Incremental runs are not free: every image is still stat'ed to find changes,
+and the BK-tree is rebuilt in memory from all cached hashes.  Both take time
+proportional to the size of the archive, and are reported separately from
+the time of the queries themselves.
+
+Reported problems:
+
+  * duplicate         two comics with nearby numbers have the same image
+                      (like comic 2308 in the archive)
+  * out of sequence   comic image matches an image of a comic far away
+                      (like comic 3901 being overwritten by 3906)
+  * missing           comic number without an image
+  * unreadable        image file which cannot be decoded
+
+Requires NumPy and Pillow.
+
+Example:
+
+    cd /path/to/crawl/output
+    python3 qc_phash.py --all
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+
+import argparse
+import io
+import os
+import re
+import sys
+import time
+
+import numpy
+from PIL import Image
+
+import qc_pack
+
+
+CACHE_FILE = 'phash.tsv'
+HASH_SIZE = 8
+# images are shrunk to this size before DCT
+IMAGE_SIZE = 32
+# maximum Hamming distance between hashes of near-duplicate images
+DEFAULT_DISTANCE = 6
+# near-duplicates closer than this are reported as duplicates,
+# otherwise as out of sequence
+DEFAULT_WINDOW = 3
+IMAGE_EXTENSIONS = ('png', 'gif', 'jpg')
+# file layout produced by crawl.sh: NN/NNNN.ext
+image_path_regex = re.compile('([0-9]{2,})/([0-9]{4,})\\.(' + '|'.join(IMAGE_EXTENSIONS) + ')$')
+
+
+def dct_matrix(n):
+    """
+    Orthonormal DCT-II matrix of size n x n.
+    """
+    k = numpy.arange(n).reshape(-1, 1)
+    i = numpy.arange(n).reshape(1, -1)
+    d = numpy.cos(numpy.pi * (2 * i + 1) * k / (2 * n)) * numpy.sqrt(2.0 / n)
+    d[0, :] = numpy.sqrt(1.0 / n)
+    return d
+
+
+DCT = dct_matrix(IMAGE_SIZE)
+
+
+def load_pixels(file):
+    """
+    'file' is a file name or a file object.
+    """
+    with Image.open(file) as img:
+        img.seek(0)  # first frame of animated GIFs
+        small = img.convert('L').resize((IMAGE_SIZE, IMAGE_SIZE), Image.LANCZOS)
+        return numpy.asarray(small, dtype=numpy.float64)
+
+
+def phash_batch(pixels):
+    """
+    Compute perceptual hashes for a stack of grayscale images of shape
+    (N, IMAGE_SIZE, IMAGE_SIZE) at once.  Returns a list of N integers.
+    """
+    if len(pixels) == 0:
+        return []
+    # 2D DCT of every image in the batch: DCT @ X @ DCT.T
+    coefficients = numpy.einsum('ij,njk,lk->nil', DCT, pixels, DCT)
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # skip the DC term when computing the median
+    medians = numpy.median(low[:, 1:], axis=1, keepdims=True)
+    bits = (low > medians).astype(numpy.uint8)
+    packed = numpy.packbits(bits, axis=1)
+    return [int.from_bytes(row.tobytes(), 'big') for row in packed]
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of 64-bit hashes with Hamming distance metric.
+    Each node holds all comic numbers with exactly the same hash.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, h, num):
+        if self.root is None:
+            self.root = (h, [num], {})
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(num)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (h, [num], {})
+                return
+            node = child
+
+    def find(self, h, max_distance):
+        """
+        Yield tuples (distance, comic number) of all hashes within
+        'max_distance' of hash 'h'.
+        """
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                for num in node[1]:
+                    yield (d, num)
+            for child_d, child in node[2].items():
+                if d - max_distance <= child_d <= d + max_distance:
+                    stack.append(child)
+
+
+def find_images(directory):
+    """
+    Returns dict from comic number to path of its image.
+    """
+    images = {}
+    for entry in sorted(os.listdir(directory)):
+        subdir = os.path.join(directory, entry)
+        if not entry.isdigit() or not os.path.isdir(subdir):
+            continue
+        for name in sorted(os.listdir(subdir)):
+            path = entry + '/' + name
+            m = image_path_regex.match(path)
+            if m:
+                images[int(m.group(2))] = path
+    return images
+
+
+def find_packed_images(store, directory):
+    """
+    Returns dict from comic number to tuple (path, size, offset) of packed
+    images.  Paths are 'NN.pack:NN/NNNN.ext', as in 'qc_verify.py'.  Offset
+    in the pack takes the place of modification time: it changes when an
+    image is replaced.
+    """
+    images = {}
+    for num, ext, size, sha1 in store.records():
+        century = qc_pack.century(num)
+        offset = store.pack(num).find(num)[1]
+        path = '{}:{}/{:04d}.{}'.format(os.path.join(directory, century + '.pack'), century, num, ext)
+        images[num] = (path, size, offset)
+    return images
+
+
+def load_packed_pixels(store, num):
+    view = store.get(num)
+    try:
+        data = bytes(view)
+    finally:
+        view.release()
+    return load_pixels(io.BytesIO(data))
+
+
+def read_cache(filename):
+    cache = {}
+    try:
+        with open(filename, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    num, path, size, mtime, h = line.rstrip('\n').split('\t')
+                    cache[int(num)] = (path, int(size), int(mtime), int(h, 16))
+                except ValueError:
+                    print("Ignoring malformed line {} of '{}'.".format(line_number, filename), file=sys.stderr)
+    except FileNotFoundError:
+        pass
+    return cache
+
+
+def write_cache(filename, cache):
+    tmp = filename + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for num, (path, size, mtime, h) in sorted(cache.items()):
+            f.write('{}\t{}\t{}\t{}\t{:016x}\n'.format(num, path, size, mtime, h))
+    os.replace(tmp, filename)
+
+
+def update_hashes(directory, cache, images, store=None, packed=None, batch_size=256):
+    """
+    Hash images which are new or changed since they were cached.  Packed
+    images 'packed' (see find_packed_images) are read from PackStore 'store'.
+    Returns tuple (rehashed, unreadable) of lists of comic numbers.
+    Unreadable images are removed from the cache, so that their stale
+    hashes are not reported as current.
+    """
+    packed = packed or {}
+    for num in list(cache):
+        if num not in images and num not in packed:
+            del cache[num]
+    todo = []
+    for num, path in images.items():
+        st = os.stat(os.path.join(directory, path))
+        todo.append((num, path, st.st_size, st.st_mtime_ns))
+    for num, (path, size, offset) in packed.items():
+        if num not in images:
+            todo.append((num, path, size, offset))
+    todo = [item for item in todo if cache.get(item[0], (None, None, None))[:3] != item[1:]]
+    unreadable = []
+    for i in range(0, len(todo), batch_size):
+        batch = []
+        pixels = []
+        for item in todo[i:i + batch_size]:
+            try:
+                if item[0] in images:
+                    pixels.append(load_pixels(os.path.join(directory, item[1])))
+                else:
+                    pixels.append(load_packed_pixels(store, item[0]))
+                batch.append(item)
+            except (OSError, ValueError) as e:
+                print("Cannot read image '{}': {}".format(item[1], e), file=sys.stderr)
+                cache.pop(item[0], None)
+                unreadable.append(item[0])
+        hashes = phash_batch(numpy.stack(pixels)) if pixels else []
+        for (num, path, size, mtime), h in zip(batch, hashes):
+            cache[num] = (path, size, mtime, h)
+        print("Hashed {} of {} images.".format(min(i + batch_size, len(todo)), len(todo)), file=sys.stderr)
+    return ([item[0] for item in todo if item[0] in cache], unreadable)
+
+
+def build_index(cache):
+    tree = BKTree()
+    for num, (path, size, mtime, h) in cache.items():
+        tree.add(h, num)
+    return tree
+
+
+def find_problems(tree, cache, check, max_distance, window):
+    """
+    Check comics 'check' against the index in a single pass.
+    Returns tuple (duplicates, out_of_sequence, missing).
+    """
+    duplicates = set()
+    out_of_sequence = set()
+    for num in check:
+        h = cache[num][3]
+        for d, other in tree.find(h, max_distance):
+            if other == num:
+                continue
+            pair = (min(num, other), max(num, other), d)
+            if abs(num - other) <= window:
+                duplicates.add(pair)
+            else:
+                out_of_sequence.add(pair)
+    missing = []
+    if cache:
+        missing = [n for n in range(1, max(cache) + 1) if n not in cache]
+    return (sorted(duplicates), sorted(out_of_sequence), missing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicated and misnumbered comic images.")
+    parser.add_argument('-d', '--directory', default='.',
+            help="directory with output of crawl.sh (default: current directory)")
+    parser.add_argument('--all', action='store_true',
+            help="check all images, not only new and changed ones")
+    parser.add_argument('--distance', type=int, default=DEFAULT_DISTANCE,
+            help="maximum Hamming distance between near-duplicates (default: %(default)s)")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+            help="near-duplicates with numbers this close are duplicates, "
+                 "others are out of sequence (default: %(default)s)")
+    parser.add_argument('--packs', help="also hash images packed in this directory by qc_pack.py")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache_file = os.path.join(args.directory, CACHE_FILE)
+    cache = read_cache(cache_file)
+    full = args.all or not cache
+    images = find_images(args.directory)
+    store = qc_pack.PackStore(args.packs) if args.packs else None
+    packed = find_packed_images(store, args.packs) if store else {}
+    print("Found {} images, {} packed.".format(len(images), len(packed)), file=sys.stderr)
+    changed, unreadable = update_hashes(args.directory, cache, images, store, packed)
+    if store:
+        store.close()
+    write_cache(cache_file, cache)
+    scanned = time.perf_counter()
+
+    tree = build_index(cache)
+    indexed = time.perf_counter()
+    check = sorted(cache) if full else changed
+    duplicates, out_of_sequence, missing = find_problems(tree, cache, check, args.distance, args.window)
+    checked = time.perf_counter()
+    print("Scanned and hashed in {:.3f} s, indexed {} hashes in {:.3f} s, checked {} images in {:.3f} s."
+        .format(scanned - start, len(cache), indexed - scanned, len(check), checked - indexed), file=sys.stderr)
+
+    for a, b, d in duplicates:
+        print("duplicate\t{}\t{}\t{}".format(a, b, d))
+    for a, b, d in out_of_sequence:
+        print("out of sequence\t{}\t{}\t{}".format(a, b, d))
+    for n in unreadable:
+        print("unreadable\t{}".format(n))
+    if full:
+        for n in missing:
+            if n not in unreadable:
+                print("missing\t{}".format(n))
+    return 1 if duplicates or out_of_sequence or unreadable else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+r"""
+Coordinator for running 'crawl.sh' on several workers or machines.
+
+The range of comic numbers is split into shards of fixed size, aligned to
+the hundreds used for directories 'NN/'.  Shard i is assigned to worker
+slot i % WORKERS, so the assignment is the same on every run.  Shards are
+kept in an SQLite database, which all workers share.  A worker takes
+a lease on a shard before crawling it and renews it while crawling, see
+'shard-worker.sh'.  When a worker dies, its lease expires and the shard is
+taken over by another worker, so only the work of that shard is lost.
+
+Each worker writes its own manifest (see variable MANIFEST in 'crawl.sh'),
+so that no locking is needed while crawling.  Manifests are merged
+afterwards with command 'merge'.
+
+Commands:
+
+    init FIRST LAST      create shards for comics FIRST..LAST
+    claim WORKER SLOT    lease a shard and print "ID FIRST LAST"
+    renew ID WORKER      extend lease of a shard, which the worker still holds
+    done ID WORKER [FIRST LAST]
+                         mark leased shard as done, if its range is still
+                         FIRST..LAST
+    status               print state of all shards
+    merge MANIFEST...    merge manifests of workers into one
+
+Example:
+
+    python3 qc_shard.py --db shards.sqlite init --workers 4 1 5600
+    ./shard-worker.sh shards.sqlite worker-0 0
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+
+import argparse
+import sqlite3
+import sys
+import time
+
+
+DEFAULT_DB = 'shards.sqlite'
+DEFAULT_SHARD_SIZE = 100
+DEFAULT_LEASE_SECONDS = 60 * 60
+
+
+def connect(filename):
+    db = sqlite3.connect(filename, timeout=60, isolation_level=None)
+    db.execute('''CREATE TABLE IF NOT EXISTS shards (
+        id INTEGER PRIMARY KEY,
+        first INTEGER NOT NULL,
+        last INTEGER NOT NULL,
+        slot INTEGER NOT NULL,
+        worker TEXT,
+        lease_until REAL,
+        done INTEGER NOT NULL DEFAULT 0)''')
+    return db
+
+
+def init(db, first, last, shard_size, workers):
+    """
+    Create shards deterministically: shard boundaries depend only on
+    'shard_size', so re-running init with a wider range adds shards and
+    extends partial shards at the ends of the old range.  Extended shards
+    become pending again, even if they were done.
+    """
+    db.execute('BEGIN IMMEDIATE')
+    for start in range(first - first % shard_size, last + 1, shard_size):
+        shard_id = start // shard_size
+        db.execute('''INSERT INTO shards (id, first, last, slot) VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                done = CASE WHEN excluded.first < first OR excluded.last > last THEN 0 ELSE done END,
+                first = MIN(first, excluded.first),
+                last = MAX(last, excluded.last)''',
+            (shard_id, max(start, first), min(start + shard_size - 1, last), shard_id % workers))
+    db.execute('COMMIT')
+
+
+def claim(db, worker, slot, lease_seconds):
+    """
+    Lease a shard for 'worker'.  Shards of the worker's own slot are taken
+    first, then expired or unassigned shards of other slots.
+    Returns tuple (id, first, last) or None, if everything is done or leased.
+    """
+    now = time.time()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        row = db.execute('''SELECT id, first, last FROM shards
+            WHERE done = 0 AND (worker = ? OR lease_until IS NULL OR lease_until < ?)
+            ORDER BY slot != ?, id LIMIT 1''', (worker, now, slot)).fetchone()
+        if row is not None:
+            db.execute('UPDATE shards SET worker = ?, lease_until = ? WHERE id = ?',
+                (worker, now + lease_seconds, row[0]))
+        db.execute('COMMIT')
+    except:
+        db.execute('ROLLBACK')
+        raise
+    return row
+
+
+def renew(db, shard_id, worker, lease_seconds):
+    cursor = db.execute('UPDATE shards SET lease_until = ? WHERE id = ? AND worker = ? AND done = 0',
+        (time.time() + lease_seconds, shard_id, worker))
+    return cursor.rowcount == 1
+
+
+def finish(db, shard_id, worker, first=None, last=None):
+    """
+    Mark shard as done.  If 'first' and 'last' are given, the shard is not
+    marked when init has extended it while it was being crawled.
+    """
+    if first is None:
+        cursor = db.execute('UPDATE shards SET done = 1, lease_until = NULL WHERE id = ? AND worker = ?',
+            (shard_id, worker))
+    else:
+        cursor = db.execute('''UPDATE shards SET done = 1, lease_until = NULL
+            WHERE id = ? AND worker = ? AND first = ? AND last = ?''', (shard_id, worker, first, last))
+    return cursor.rowcount == 1
+
+
+def status(db):
+    now = time.time()
+    for shard_id, first, last, slot, worker, lease_until, done in db.execute(
+            'SELECT id, first, last, slot, worker, lease_until, done FROM shards ORDER BY id'):
+        if done:
+            state = 'done by {}'.format(worker)
+        elif lease_until is not None and lease_until >= now:
+            state = 'leased by {} for {:.0f} s'.format(worker, lease_until - now)
+        else:
+            state = 'pending'
+        print('{}\t{}..{}\tslot {}\t{}'.format(shard_id, first, last, slot, state))
+
+
+def merge(manifests):
+    """
+    Merge manifests 'number<TAB>path<TAB>size<TAB>sha1'.  Workers append to
+    their manifests on every run, so the last entry of each comic wins, as
+    the most recent download.  Conflicting entries are reported.
+    """
+    entries = {}
+    for filename in manifests:
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 4 or not fields[0].isdigit():
+                    continue
+                num = int(fields[0])
+                if num in entries and entries[num][3] != fields[3]:
+                    print("Conflict for comic {}: '{}' and '{}'".format(num, entries[num][1], fields[1]),
+                        file=sys.stderr)
+                entries[num] = fields
+    for num in sorted(entries):
+        print('\t'.join(entries[num]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coordinate sharded crawl of comics.")
+    parser.add_argument('--db', default=DEFAULT_DB, help="shared SQLite database (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('init', help="create shards")
+    p.add_argument('first', type=int)
+    p.add_argument('last', type=int)
+    p.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE)
+    p.add_argument('--workers', type=int, default=1)
+    p = commands.add_parser('claim', help="lease a shard")
+    p.add_argument('worker')
+    p.add_argument('slot', type=int)
+    p.add_argument('--lease', type=int, default=DEFAULT_LEASE_SECONDS, help="lease duration in seconds")
+    p = commands.add_parser('renew', help="extend lease of a shard")
+    p.add_argument('id', type=int)
+    p.add_argument('worker')
+    p.add_argument('--lease', type=int, default=DEFAULT_LEASE_SECONDS, help="lease duration in seconds")
+    p = commands.add_parser('done', help="mark shard as done")
+    p.add_argument('id', type=int)
+    p.add_argument('worker')
+    p.add_argument('first', type=int, nargs='?')
+    p.add_argument('last', type=int, nargs='?')
+    commands.add_parser('status', help="print state of shards")
+    p = commands.add_parser('merge', help="merge manifests")
+    p.add_argument('manifests', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'merge':
+        merge(args.manifests)
+        return 0
+    db = connect(args.db)
+    if args.command == 'init':
+        init(db, args.first, args.last, args.shard_size, args.workers)
+    elif args.command == 'claim':
+        row = claim(db, args.worker, args.slot, args.lease)
+        if row is None:
+            return 1
+        print('{} {} {}'.format(*row))
+    elif args.command == 'renew':
+        if not renew(db, args.id, args.worker, args.lease):
+            print("Shard {} is not leased by {}.".format(args.id, args.worker), file=sys.stderr)
+            return 1
+    elif args.command == 'done':
+        if not finish(db, args.id, args.worker, args.first, args.last):
+            print("Shard {} is not leased by {} or was extended.".format(args.id, args.worker), file=sys.stderr)
+            return 1
+    elif args.command == 'status':
+        status(db)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
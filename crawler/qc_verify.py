@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+r"""
+Verifies integrity of comic images downloaded by 'crawl.sh'.
+
+Every image is checked for the signature at the start of the file and the
+end-of-image marker of its format (PNG IEND chunk, JPEG EOI marker, GIF
+trailer), which catches truncated downloads and HTML error pages saved as
+images.  Files are checked on all CPU cores.  Optionally, sizes of files are
+compared with Content-Length reported by the website.
+
+Hashes of verified files are kept in file 'verified.tsv', so that later runs
+check only files whose size or modification time has changed.  Corrupt files
+are renamed to '*.corrupt' and their comic numbers are appended to file
+'redownload.txt', which is read by 'crawl.sh'.  The queue is locked with file
+'redownload.txt.lock', the same as in 'crawl.sh'.
+
+With option --packs, images packed by 'qc_pack.py' are checked too.  They
+are listed as 'NN.pack:NN/NNNN.ext', the same as in manifests of 'crawl.sh'.
+Corrupt packed images stay in the pack until 'crawl.sh' downloads them again
+and replaces them.
+
+Example:
+
+    cd /path/to/crawl/output
+    python3 qc_verify.py --remote
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+
+import argparse
+import fcntl
+import hashlib
+import itertools
+import os
+import re
+import sys
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from socket import timeout
+
+import qc_pack
+
+
+ROOT_URL = 'https://www.questionablecontent.net'
+VERIFIED_FILE = 'verified.tsv'
+QUEUE_FILE = 'redownload.txt'
+# number of concurrent HEAD requests for option --remote
+REMOTE_BATCH_SIZE = 8
+image_path_regex = re.compile('[0-9]{2,}/([0-9]{4,})\\.(png|gif|jpg)$')
+
+# format: (signatures, check of the end of file)
+FORMATS = {
+    'png': ((b'\x89PNG\r\n\x1a\n',), lambda data: data.endswith(b'IEND\xaeB`\x82')),
+    # some encoders pad JPEG files after the EOI marker
+    'jpg': ((b'\xff\xd8\xff',), lambda data: data.rstrip(b'\x00\r\n ').endswith(b'\xff\xd9')),
+    'gif': ((b'GIF87a', b'GIF89a'), lambda data: data.rstrip(b'\x00').endswith(b'\x3b')),
+}
+
+
+def check_image(data):
+    """
+    Returns None if 'data' is a complete image, or description of the problem.
+    """
+    if len(data) == 0:
+        return 'empty'
+    for name, (signatures, is_complete) in FORMATS.items():
+        if data.startswith(signatures):
+            if not is_complete(data):
+                return 'truncated ' + name
+            return None
+    if data.lstrip()[:1] == b'<':
+        return 'HTML instead of image'
+    return 'unknown format'
+
+
+def verify(item):
+    """
+    Worker of the process pool. 'item' is tuple (path, size, mtime).
+    Returns tuple (path, size, mtime, sha1, problem).
+    """
+    path, size, mtime = item
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return (path, size, mtime, '', str(e))
+    return (path, size, mtime, hashlib.sha1(data).hexdigest(), check_image(data))
+
+
+# PackStore of each worker process, opened by open_packs()
+packs = None
+
+
+def open_packs(directory):
+    global packs
+    packs = qc_pack.PackStore(directory)
+
+
+def verify_packed(item):
+    """
+    Worker of the process pool for packed images. 'item' is tuple
+    (path, size, offset).  Returns the same as function verify().
+    """
+    path, size, offset = item
+    m = image_path_regex.search(path)
+    view = packs.get(int(m.group(1)))
+    if view is None:
+        return (path, size, offset, '', 'not in pack')
+    try:
+        data = bytes(view)
+    finally:
+        view.release()
+    return (path, size, offset, hashlib.sha1(data).hexdigest(), check_image(data))
+
+
+def remote_size(path):
+    m = image_path_regex.search(path.replace(os.sep, '/'))
+    url = '{}/comics/{}.{}'.format(ROOT_URL, int(m.group(1)), m.group(2))
+    try:
+        req = urllib.request.Request(url, method='HEAD', headers={'User-Agent': "Magic"})
+        with urllib.request.urlopen(req, timeout=10) as response:
+            length = response.headers.get('Content-Length')
+            return int(length) if length is not None else None
+    except (urllib.error.URLError, timeout, ValueError):
+        return None
+
+
+def find_images(directory):
+    images = []
+    for entry in sorted(os.listdir(directory)):
+        subdir = os.path.join(directory, entry)
+        if not entry.isdigit() or not os.path.isdir(subdir):
+            continue
+        for name in sorted(os.listdir(subdir)):
+            path = os.path.join(subdir, name)
+            if image_path_regex.search(entry + '/' + name):
+                st = os.stat(path)
+                images.append((path, st.st_size, st.st_mtime_ns))
+    return images
+
+
+def find_packed_images(directory):
+    """
+    List packed images as tuples (path, size, offset).  Offset in the pack
+    takes the place of modification time: it changes when an image is
+    replaced.
+    """
+    store = qc_pack.PackStore(directory)
+    images = []
+    try:
+        for num, ext, size, sha1 in store.records():
+            century = qc_pack.century(num)
+            offset = store.pack(num).find(num)[1]
+            path = '{}:{}/{:04d}.{}'.format(os.path.join(directory, century + '.pack'), century, num, ext)
+            images.append((path, size, offset))
+    finally:
+        store.close()
+    return images
+
+
+def read_verified(filename):
+    verified = {}
+    try:
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                path, size, mtime, sha1 = line.rstrip('\n').split('\t')
+                verified[path] = (int(size), int(mtime), sha1)
+    except FileNotFoundError:
+        pass
+    return verified
+
+
+def write_verified(filename, verified):
+    tmp = filename + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for path, (size, mtime, sha1) in sorted(verified.items()):
+            f.write('{}\t{}\t{}\t{}\n'.format(path, size, mtime, sha1))
+    os.replace(tmp, filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify integrity of downloaded comic images.")
+    parser.add_argument('-d', '--directory', default='.',
+            help="directory with output of crawl.sh (default: current directory)")
+    parser.add_argument('--all', action='store_true',
+            help="check all files, not only new and changed ones")
+    parser.add_argument('--remote', action='store_true',
+            help="compare file sizes with Content-Length on the website")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+            help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--packs', help="also check images packed in this directory by qc_pack.py")
+    args = parser.parse_args()
+
+    verified_file = os.path.join(args.directory, VERIFIED_FILE)
+    verified = read_verified(verified_file)
+    images = find_images(args.directory)
+    packed = find_packed_images(args.packs) if args.packs else []
+    images = images + packed
+    packed = {path for path, size, offset in packed}
+    present = {path for path, size, mtime in images}
+    for path in list(verified):
+        if path not in present:
+            del verified[path]
+    todo = [item for item in images
+            if args.all or verified.get(item[0], (None, None))[:2] != item[1:]]
+    print("Checking {} of {} files.".format(len(todo), len(images)), file=sys.stderr)
+
+    corrupt = {}
+    with Pool(args.jobs, initializer=open_packs if args.packs else None, initargs=(args.packs,)) as pool:
+        results = itertools.chain(
+            pool.imap_unordered(verify, [item for item in todo if item[0] not in packed], chunksize=16),
+            pool.imap_unordered(verify_packed, [item for item in todo if item[0] in packed], chunksize=16))
+        for path, size, mtime, sha1, problem in results:
+            if problem is None:
+                verified[path] = (size, mtime, sha1)
+            else:
+                corrupt[path] = problem
+                verified.pop(path, None)
+
+    if args.remote:
+        sizes = {path: size for path, size, mtime in todo if path not in corrupt}
+        with ThreadPoolExecutor(max_workers=REMOTE_BATCH_SIZE) as pool:
+            for path, length in zip(sizes, pool.map(remote_size, sizes)):
+                if length is not None and length != sizes[path]:
+                    corrupt[path] = 'size {} instead of {}'.format(sizes[path], length)
+                    verified.pop(path, None)
+    write_verified(verified_file, verified)
+
+    if corrupt:
+        queue_file = os.path.join(args.directory, QUEUE_FILE)
+        with open(queue_file + '.lock', 'w') as lock, open(queue_file, 'a', encoding='utf-8') as queue:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            for path, problem in sorted(corrupt.items()):
+                print("{}: {}".format(path, problem))
+                if path not in packed:
+                    os.replace(path, path + '.corrupt')
+                m = image_path_regex.search(path.replace(os.sep, '/'))
+                queue.write('{}\n'.format(int(m.group(1))))
+    print("Found {} corrupt files.".format(len(corrupt)), file=sys.stderr)
+    return 1 if corrupt else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+r"""
+Cross-checks comic titles parsed from 'archive-list.php' against titles on
+pages 'view.php?comic=N' of the QC website.
+
+Pages are downloaded concurrently, with a global limit on the request rate,
+and cached on disk at the same paths 'NN/NNNN.html' as 'crawl.sh' uses.
+Validators (ETag and Last-Modified) are kept in file 'view_cache.tsv', so
+that cached pages are revalidated with conditional requests and only new or
+changed pages are downloaded again.
+
+Mismatches are printed as a corrections report in the format of the fixes
+in function parse_archive() of 'qc_titles.py'.
+
+Example:
+
+    cd /path/to/crawl/output
+    python3 qc_view_check.py --titles ../core_stable/data.lua 5000 5100
+"""
+
+#
+# © Andrei Rybak, 2026
+# Written for Questionable Content Wiki
+#
+# Distributed under the terms of the MIT license.
+#
+
+import argparse
+import html
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from socket import timeout
+
+
+ROOT_URL = 'https://www.questionablecontent.net'
+VALIDATORS_FILE = 'view_cache.tsv'
+DEFAULT_TITLES_FILE = '../core_stable/data.lua'
+DEFAULT_WORKERS = 4
+# minimum number of seconds between starts of two requests
+DEFAULT_INTERVAL = 0.5
+# cached pages younger than this are not revalidated
+DEFAULT_MAX_AGE_DAYS = 7
+
+lua_item_regex = re.compile(r'^\[([0-9]+)\]="((?:[^"\\]|\\.)*)",?$')
+h1_regex = re.compile(r'<h1[^>]*>(.*?)</h1>', re.DOTALL | re.IGNORECASE)
+title_tag_regex = re.compile(r'<title[^>]*>(.*?)</title>', re.DOTALL | re.IGNORECASE)
+tag_regex = re.compile(r'<[^>]+>')
+# view.php prefixes titles with comic number, e.g. "Number 42: Title" or "4200: Title"
+number_prefix_regex = re.compile(r'^(?:Number\s+[^:]+|[0-9]+)\s*:\s*')
+
+
+def url(n):
+    return ROOT_URL + '/view.php?comic=' + str(n)
+
+
+def cache_path(directory, n):
+    return os.path.join(directory, '{:02d}'.format(n // 100), '{:04d}.html'.format(n))
+
+
+def read_lua_titles(filename):
+    """
+    Read file generated by parse_archive() of 'qc_titles.py'.
+    Returns dict from comic number to title.
+    """
+    titles = {}
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            m = lua_item_regex.match(line.strip())
+            if m:
+                titles[int(m.group(1))] = m.group(2).replace('\\"', '"')
+    return titles
+
+
+def read_validators(filename):
+    validators = {}
+    try:
+        with open(filename, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    num, etag, last_modified = line.rstrip('\n').split('\t')
+                    validators[int(num)] = (etag, last_modified)
+                except ValueError:
+                    print("Ignoring malformed line {} of '{}'.".format(line_number, filename), file=sys.stderr)
+    except FileNotFoundError:
+        pass
+    return validators
+
+
+def write_validators(filename, validators):
+    tmp = filename + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for num, (etag, last_modified) in sorted(validators.items()):
+            f.write('{}\t{}\t{}\n'.format(num, etag, last_modified))
+    os.replace(tmp, filename)
+
+
+class RateLimiter:
+    """
+    Allows at most one call of wait() to return every 'interval' seconds,
+    across all threads.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def fetch(n, directory, validators, limiter):
+    """
+    Download page of comic 'n' unless the cached copy is still valid.
+    Returns tuple (n, status, validators), where status is one of
+    'downloaded', 'not modified' or an error message.
+    """
+    path = cache_path(directory, n)
+    headers = {'User-Agent': "Magic"}
+    etag, last_modified = validators.get(n, ('', ''))
+    if os.path.exists(path):
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    limiter.wait()
+    try:
+        req = urllib.request.Request(url(n), headers=headers)
+        with urllib.request.urlopen(req, timeout=10) as response:
+            data = response.read()
+            etag = response.headers.get('ETag', '')
+            last_modified = response.headers.get('Last-Modified', '')
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            os.utime(path)
+            return (n, 'not modified', None)
+        return (n, str(e), None)
+    except (urllib.error.URLError, timeout) as e:
+        return (n, str(e), None)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return (n, 'downloaded', (etag, last_modified))
+
+
+def extract_title(page):
+    """
+    Returns title of the comic from HTML of its view.php page or None.
+    """
+    m = h1_regex.search(page) or title_tag_regex.search(page)
+    if not m:
+        return None
+    t = html.unescape(tag_regex.sub('', m.group(1))).strip()
+    t = number_prefix_regex.sub('', t, count=1)
+    return ' '.join(t.split()) or None
+
+
+def normalize(title):
+    return ' '.join(html.unescape(title).split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check archive titles against view.php pages.")
+    parser.add_argument('first', type=int, nargs='?', default=1, help="first comic to check")
+    parser.add_argument('last', type=int, nargs='?', help="last comic to check (default: last in titles)")
+    parser.add_argument('-d', '--directory', default='.',
+            help="directory for cached pages (default: current directory)")
+    parser.add_argument('--titles', default=DEFAULT_TITLES_FILE,
+            help="Lua file produced by qc_titles.py (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+            help="number of concurrent downloads (default: %(default)s)")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+            help="minimum seconds between requests (default: %(default)s)")
+    parser.add_argument('--max-age', type=float, default=DEFAULT_MAX_AGE_DAYS,
+            help="do not revalidate cached pages younger than this many days (default: %(default)s)")
+    args = parser.parse_args()
+
+    titles = read_lua_titles(args.titles)
+    if not titles:
+        print("No titles in '{}'.".format(args.titles), file=sys.stderr)
+        return 2
+    last = args.last or max(titles)
+    validators_file = os.path.join(args.directory, VALIDATORS_FILE)
+    validators = read_validators(validators_file)
+
+    now = time.time()
+    todo = []
+    for n in range(args.first, last + 1):
+        try:
+            age = now - os.path.getmtime(cache_path(args.directory, n))
+            if age < args.max_age * 24 * 3600:
+                continue
+        except OSError:
+            pass
+        todo.append(n)
+    print("Checking {} pages, {} are cached and fresh.".format(
+        len(todo), last - args.first + 1 - len(todo)), file=sys.stderr)
+
+    limiter = RateLimiter(args.interval)
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(fetch, n, args.directory, validators, limiter) for n in todo]
+        for future in futures:
+            n, status, new_validators = future.result()
+            if new_validators is not None:
+                validators[n] = new_validators
+            elif status != 'not modified':
+                print("Comic {}: {}".format(n, status), file=sys.stderr)
+    write_validators(validators_file, validators)
+
+    mismatches = 0
+    for n in range(args.first, last + 1):
+        try:
+            with open(cache_path(args.directory, n), encoding='utf-8', errors='ignore') as f:
+                page_title = extract_title(f.read())
+        except OSError:
+            continue
+        archive_title = titles.get(n)
+        if page_title is None:
+            print("# {}: no title on {}".format(n, url(n)))
+            continue
+        if archive_title is not None and normalize(archive_title) == page_title:
+            continue
+        mismatches += 1
+        print('m[{}] = "{}"  # archive: {}'.format(n, page_title.replace('"', '\\"'),
+            '"{}"'.format(archive_title) if archive_title is not None else 'missing'))
+    print("Found {} mismatched titles.".format(mismatches), file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+#!/bin/bash
+
+#
+# Worker of a sharded crawl, see qc_shard.py.
+# Leases shards from the shared database and runs crawl.sh for each of them,
+# until all shards are done.  The lease is renewed in background every
+# LEASE / 3 seconds while crawl.sh runs, so that long shards are not taken
+# over by other workers.
+#
+# Usage: shard-worker.sh DB WORKER_ID SLOT
+#
+
+set -u
+DB="$1"
+WORKER="$2"
+SLOT="$3"
+LEASE=${LEASE:-3600}
+TOOLS="$(dirname "$0")"
+export MANIFEST="manifest-$WORKER.tsv"
+
+while SHARD=$(python3 "$TOOLS/qc_shard.py" --db "$DB" claim --lease "$LEASE" "$WORKER" "$SLOT")
+do
+	read ID FROM LAST <<< "$SHARD"
+	echo "Worker $WORKER: shard $ID ($FROM .. $LAST)"
+	while sleep $(( LEASE / 3 ))
+	do
+		python3 "$TOOLS/qc_shard.py" --db "$DB" renew --lease "$LEASE" "$ID" "$WORKER" || break
+	done &
+	RENEW=$!
+	SHARD="$ID" "$TOOLS/crawl.sh" "$FROM" "$LAST"
+	STATUS=$?
+	kill $RENEW 2>/dev/null
+	wait $RENEW 2>/dev/null
+	if (( STATUS == 0 ))
+	then
+		python3 "$TOOLS/qc_shard.py" --db "$DB" done "$ID" "$WORKER" "$FROM" "$LAST"
+	fi
+done
+echo "Worker $WORKER: no more shards"